@@ -0,0 +1,552 @@
+import sys
+import warnings
+import numpy as np
+from tracing import span
+
+TIMESTAMP_COLUMN = "timestamp"
+CSV_CHUNK_ROWS = 1_000_000
+
+# Backends are looked up by name and built on first use, so a process only
+# imports the dataframe library it actually computes with.
+BACKENDS = {}
+_instances = {}
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def backend_name(backend=None, use_polars=False):
+    # use_polars is kept as the old spelling of backend="polars".
+    if backend is None:
+        return "polars" if use_polars else "pandas"
+    if isinstance(backend, Backend):
+        return backend.name
+    return backend
+
+
+def get_backend(backend=None, use_polars=False):
+    if isinstance(backend, Backend):
+        return backend
+    name = backend_name(backend, use_polars)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; expected one of {sorted(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def _to_datetime(value):
+    return np.datetime64(value, "us").item()
+
+
+def timestamp_keys(values):
+    # int64 nanoseconds of a timestamp column, for chronological ordering.
+    # ISO strings and datetime64 convert in NumPy; other formats (e.g.
+    # "1/9/2024") go through pandas. Raises ValueError for values that are
+    # not timestamps.
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return values.astype(np.int64)
+    try:
+        return values.astype("datetime64[ns]").astype(np.int64)
+    except (ValueError, TypeError):
+        import pandas as pd
+
+        with warnings.catch_warnings():
+            # pandas warns before falling back to per-element parsing
+            warnings.simplefilter("ignore", UserWarning)
+            parsed = pd.to_datetime(pd.Series(values)).astype("datetime64[ns]")
+        return parsed.to_numpy().astype(np.int64)
+
+
+def _runs(keys):
+    # Start/stop rows of each run of equal keys in a grouped column.
+    if len(keys) == 0:
+        starts = np.array([], dtype=int)
+    else:
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, np.r_[starts[1:], len(keys)].astype(int)
+
+
+def _read_columns(columns, symbols, start, end):
+    if columns is None:
+        return None
+    needed = list(columns)
+    if symbols is not None and "symbol" not in needed:
+        needed.append("symbol")
+    if (start is not None or end is not None) and TIMESTAMP_COLUMN not in needed:
+        needed.append(TIMESTAMP_COLUMN)
+    return needed
+
+
+def read_arrow_table(path, decode_symbols=True):
+    # Memory-maps a cached Arrow IPC file. The symbol column is stored
+    # dictionary-encoded and decoded back to plain strings unless
+    # decode_symbols is off (compact loads keep the integer codes).
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if decode_symbols and "symbol" in table.column_names:
+        i = table.column_names.index("symbol")
+        table = table.set_column(i, "symbol", table["symbol"].cast(pa.large_string()))
+    return table
+
+
+def filter_arrow_table(table, symbols=None, start=None, end=None, columns=None):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if symbols is not None:
+        # On a dictionary column is_in matches the dictionary once and then
+        # filters rows by integer code.
+        symbol_type = table["symbol"].type
+        if pa.types.is_dictionary(symbol_type):
+            symbol_type = symbol_type.value_type
+        value_set = pa.array(list(symbols), symbol_type)
+        table = table.filter(pc.is_in(table["symbol"], value_set=value_set))
+    if start is not None or end is not None:
+        ts = table[TIMESTAMP_COLUMN]
+        if not pa.types.is_timestamp(ts.type):
+            ts = pc.cast(ts, pa.timestamp("us"))
+        mask = None
+        if start is not None:
+            mask = pc.greater_equal(ts, pa.scalar(_to_datetime(start), ts.type))
+        if end is not None:
+            upper = pc.less_equal(ts, pa.scalar(_to_datetime(end), ts.type))
+            mask = upper if mask is None else pc.and_(mask, upper)
+        table = table.filter(mask)
+    if columns is not None:
+        table = table.select(list(columns))
+    return table
+
+
+class Backend:
+    # The operations the loaders, the symbol index and the metric builders
+    # need from a dataframe library. Subclasses import their library in
+    # __init__; the defaults here work on NumPy arrays.
+    name = None
+
+    def read_csv(self, filename):
+        raise NotImplementedError
+
+    def read_csv_filtered(self, filename, symbols=None, start=None, end=None, columns=None):
+        raise NotImplementedError
+
+    def read_arrow(self, path, symbols=None, start=None, end=None, columns=None, compact=False):
+        raise NotImplementedError
+
+    def compact(self, data, float32=False):
+        # Dictionary-encoded symbols, int64 nanosecond timestamps and, with
+        # float32, single-precision prices.
+        raise NotImplementedError
+
+    def memory_usage(self, data):
+        # Bytes held by each column, counting string contents.
+        raise NotImplementedError
+
+    def symbol_runs(self, data):
+        # (starts, stops, symbols) of each symbol's rows in symbol-sorted data.
+        # Backends with categorical symbols override this to find the run
+        # boundaries by comparing integer codes instead of strings.
+        symbols = self.column(data, "symbol")
+        starts, stops = _runs(symbols)
+        return starts, stops, symbols[starts]
+
+    def sort_by_symbol(self, data):
+        # Stable sort by symbol, with the last column named "price" if no
+        # column is.
+        raise NotImplementedError
+
+    def column(self, data, name):
+        return np.asarray(data[name])
+
+    def slice(self, data, start, stop):
+        raise NotImplementedError
+
+    def returns(self, data):
+        # Always float64, also for float32 price columns.
+        prices = np.asarray(self.column(data, "price"), dtype=float)
+        returns = prices[1:] / prices[:-1] - 1
+        return returns[~np.isnan(returns)]
+
+    def rolling_mean(self, values, window=20):
+        from metrics import rolling_moments
+
+        return rolling_moments(values, window)[0]
+
+    def rolling_std(self, values, window=20):
+        from metrics import rolling_moments
+
+        return rolling_moments(values, window)[1]
+
+    def rolling_sharpe(self, values, window=20):
+        from metrics import rolling_moments
+
+        return rolling_moments(values, window)[2]
+
+    def frame(self, columns):
+        raise NotImplementedError
+
+    def batch_metrics(self, index, symbols):
+        from metrics import compute_batch_metrics
+
+        vols, dds = compute_batch_metrics(index.price_matrix(symbols))
+        return dict(zip(symbols, zip(vols, dds)))
+
+    def iter_csv_batches(self, filename, batch_rows, symbols=None):
+        # Yields (symbol, price) NumPy arrays for successive row batches.
+        raise NotImplementedError
+
+    def factorize(self, values):
+        uniques, codes = np.unique(values, return_inverse=True)
+        return codes, uniques
+
+
+@register_backend
+class PandasBackend(Backend):
+    name = "pandas"
+
+    def __init__(self):
+        import pandas as pd
+
+        self.pd = pd
+
+    def read_csv(self, filename):
+        with span("read_csv"):
+            return self.pd.read_csv(filename)
+
+    def read_csv_filtered(self, filename, symbols=None, start=None, end=None, columns=None):
+        pd = self.pd
+        symbols = None if symbols is None else set(symbols)
+        chunks = []
+        usecols = _read_columns(columns, symbols, start, end)
+        reader = pd.read_csv(filename, usecols=usecols, chunksize=CSV_CHUNK_ROWS)
+        with span("read_csv_filtered") as s:
+            for chunk in reader:
+                mask = np.ones(len(chunk), dtype=bool)
+                if symbols is not None:
+                    mask &= chunk["symbol"].isin(symbols).to_numpy()
+                if start is not None or end is not None:
+                    ts = pd.to_datetime(chunk[TIMESTAMP_COLUMN])
+                    if start is not None:
+                        mask &= (ts >= pd.Timestamp(start)).to_numpy()
+                    if end is not None:
+                        mask &= (ts <= pd.Timestamp(end)).to_numpy()
+                chunks.append(chunk[mask])
+            if chunks:
+                df = pd.concat(chunks, ignore_index=True)
+            else:
+                # a header-only file yields no chunks
+                df = pd.read_csv(filename, usecols=usecols, nrows=0)
+            s.rows = len(df)
+        if columns is not None:
+            df = df[list(columns)]
+        return df
+
+    def read_arrow(self, path, symbols=None, start=None, end=None, columns=None, compact=False):
+        with span("filter") as s:
+            table = read_arrow_table(path, decode_symbols=not compact)
+            df = filter_arrow_table(table, symbols, start, end, columns).to_pandas()
+            s.rows = len(df)
+        return df
+
+    def compact(self, data, float32=False):
+        pd = self.pd
+        data = data.copy(deep=False)
+        if "symbol" in data.columns:
+            symbols = data["symbol"].astype("category").cat.remove_unused_categories()
+            data["symbol"] = symbols.cat.reorder_categories(sorted(symbols.cat.categories))
+        if TIMESTAMP_COLUMN in data.columns and data[TIMESTAMP_COLUMN].dtype.kind != "i":
+            ts = pd.to_datetime(data[TIMESTAMP_COLUMN]).astype("datetime64[ns]")
+            data[TIMESTAMP_COLUMN] = ts.astype("int64")
+        if float32 and "price" in data.columns:
+            data["price"] = data["price"].astype("float32")
+        return data
+
+    def memory_usage(self, data):
+        return {name: int(size) for name, size in data.memory_usage(deep=True, index=False).items()}
+
+    def symbol_runs(self, data):
+        symbols = data["symbol"]
+        if not isinstance(symbols.dtype, self.pd.CategoricalDtype):
+            return super().symbol_runs(data)
+        codes = symbols.cat.codes.to_numpy()
+        starts, stops = _runs(codes)
+        return starts, stops, symbols.cat.categories.to_numpy()[codes[starts]]
+
+    def sort_by_symbol(self, data):
+        if "price" not in data.columns:
+            data = data.rename(columns={data.columns[-1]: "price"})
+        return data.sort_values("symbol", kind="stable").reset_index(drop=True)
+
+    def column(self, data, name):
+        return data[name].to_numpy()
+
+    def slice(self, data, start, stop):
+        return data.iloc[start:stop]
+
+    def returns(self, data):
+        return data["price"].astype(float).pct_change().dropna().values
+
+    def rolling_mean(self, series, window=20):
+        from metrics import rolling_ma_pd
+
+        return rolling_ma_pd(series, window)
+
+    def rolling_std(self, series, window=20):
+        from metrics import rolling_sd_pd
+
+        return rolling_sd_pd(series, window)
+
+    def rolling_sharpe(self, series, window=20):
+        from metrics import rolling_sharpe_pd
+
+        return rolling_sharpe_pd(series, window)
+
+    def frame(self, columns):
+        return self.pd.DataFrame(columns)
+
+    def iter_csv_batches(self, filename, batch_rows, symbols=None):
+        for batch in self.pd.read_csv(filename, usecols=["symbol", "price"], chunksize=batch_rows):
+            if symbols is not None:
+                batch = batch[batch["symbol"].isin(symbols)]
+            yield batch["symbol"].to_numpy(), batch["price"].to_numpy(dtype=float)
+
+    def factorize(self, values):
+        return self.pd.factorize(values)
+
+
+@register_backend
+class PolarsBackend(Backend):
+    name = "polars"
+
+    def __init__(self):
+        import polars as pl
+
+        self.pl = pl
+
+    def read_csv(self, filename):
+        with span("read_csv"):
+            return self.pl.read_csv(filename)
+
+    def read_csv_filtered(self, filename, symbols=None, start=None, end=None, columns=None):
+        return self.collect_filtered(self.pl.scan_csv(filename), symbols, start, end, columns)
+
+    def read_arrow(self, path, symbols=None, start=None, end=None, columns=None, compact=False):
+        return self.collect_filtered(self.pl.scan_ipc(path), symbols, start, end, columns, compact)
+
+    def collect_filtered(self, lf, symbols=None, start=None, end=None, columns=None, compact=False):
+        # Pushes the symbol/date predicates and the projection into the scan.
+        pl = self.pl
+        schema = lf.collect_schema()
+        predicates = []
+        if symbols is not None:
+            predicates.append(pl.col("symbol").is_in(list(symbols)))
+        if start is not None or end is not None:
+            ts = pl.col(TIMESTAMP_COLUMN)
+            if schema[TIMESTAMP_COLUMN] == pl.String:
+                ts = ts.str.to_datetime()
+            if start is not None:
+                predicates.append(ts >= _to_datetime(start))
+            if end is not None:
+                predicates.append(ts <= _to_datetime(end))
+        if predicates:
+            lf = lf.filter(pl.all_horizontal(predicates))
+        if columns is not None:
+            lf = lf.select(list(columns))
+        with span("filter") as s:
+            df = lf.collect()
+            if not compact and "symbol" in df.columns and df.schema["symbol"] != pl.String:
+                df = df.with_columns(pl.col("symbol").cast(pl.String))
+            s.rows = len(df)
+        return df
+
+    def compact(self, data, float32=False):
+        pl = self.pl
+        exprs = []
+        if "symbol" in data.columns and data.schema["symbol"] != pl.Categorical:
+            exprs.append(pl.col("symbol").cast(pl.Categorical))
+        if TIMESTAMP_COLUMN in data.columns and not data.schema[TIMESTAMP_COLUMN].is_integer():
+            ts = pl.col(TIMESTAMP_COLUMN)
+            if data.schema[TIMESTAMP_COLUMN] == pl.String:
+                ts = ts.str.to_datetime(time_unit="ns")
+            exprs.append(ts.dt.cast_time_unit("ns").cast(pl.Int64))
+        if float32 and "price" in data.columns:
+            exprs.append(pl.col("price").cast(pl.Float32))
+        return data.with_columns(exprs) if exprs else data
+
+    def memory_usage(self, data):
+        return {name: int(data[name].estimated_size()) for name in data.columns}
+
+    def symbol_runs(self, data):
+        symbols = data["symbol"]
+        if symbols.dtype != self.pl.Categorical:
+            return super().symbol_runs(data)
+        starts, stops = _runs(symbols.to_physical().to_numpy())
+        return starts, stops, symbols.gather(starts).cast(self.pl.String).to_numpy()
+
+    def sort_by_symbol(self, data):
+        if "price" not in data.columns:
+            data = data.rename({data.columns[-1]: "price"})
+        return data.sort("symbol", maintain_order=True)
+
+    def column(self, data, name):
+        return data[name].to_numpy()
+
+    def slice(self, data, start, stop):
+        return data.slice(start, stop - start)
+
+    def returns(self, data):
+        pl = self.pl
+        returns = pl.col("price").cast(pl.Float64).pct_change().fill_nan(None).drop_nulls()
+        return data.select(returns)["price"].to_numpy()
+
+    def rolling_mean(self, series, window=20):
+        from metrics import rolling_ma_pl
+
+        return rolling_ma_pl(series, window)
+
+    def rolling_std(self, series, window=20):
+        from metrics import rolling_sd_pl
+
+        return rolling_sd_pl(series, window)
+
+    def rolling_sharpe(self, series, window=20):
+        from metrics import rolling_sharpe_pl
+
+        return rolling_sharpe_pl(series, window)
+
+    def frame(self, columns):
+        return self.pl.DataFrame(columns, nan_to_null=True)
+
+    def batch_metrics(self, index, symbols):
+        from metrics import compute_batch_metrics_pl
+
+        stats = compute_batch_metrics_pl(index.data.filter(self.pl.col("symbol").is_in(symbols)))
+        return {row[0]: row[1:] for row in stats.iter_rows()}
+
+    def iter_csv_batches(self, filename, batch_rows, symbols=None):
+        pl = self.pl
+        lf = pl.scan_csv(filename).select("symbol", "price")
+        if symbols is not None:
+            lf = lf.filter(pl.col("symbol").is_in(list(symbols)))
+        for batch in lf.collect_batches(chunk_size=batch_rows):
+            yield batch["symbol"].to_numpy(), batch["price"].to_numpy()
+
+    def factorize(self, values):
+        series = self.pl.Series(values)
+        return series.rank("dense").to_numpy() - 1, series.unique().sort().to_numpy()
+
+
+class ArrayFrame:
+    # Column store for the NumPy backend: a mapping of names to equal-length
+    # arrays, with string columns held as object arrays.
+    def __init__(self, columns):
+        self._columns = {name: np.asarray(values) for name, values in columns.items()}
+
+    @classmethod
+    def from_arrow(cls, table):
+        return cls({name: table[name].to_numpy() for name in table.column_names})
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __len__(self):
+        return len(next(iter(self._columns.values()), ()))
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def rename(self, mapping):
+        return ArrayFrame({mapping.get(name, name): values for name, values in self._columns.items()})
+
+    def take(self, rows):
+        return ArrayFrame({name: values[rows] for name, values in self._columns.items()})
+
+    def slice(self, start, stop):
+        return ArrayFrame({name: values[start:stop] for name, values in self._columns.items()})
+
+
+@register_backend
+class NumpyBackend(Backend):
+    # Loads through pyarrow only; no dataframe library is imported.
+    name = "numpy"
+
+    def read_csv(self, filename):
+        with span("read_csv"):
+            return ArrayFrame.from_arrow(self._read_csv_table(filename))
+
+    def read_csv_filtered(self, filename, symbols=None, start=None, end=None, columns=None):
+        table = self._read_csv_table(filename, _read_columns(columns, symbols, start, end))
+        with span("filter") as s:
+            df = ArrayFrame.from_arrow(filter_arrow_table(table, symbols, start, end, columns))
+            s.rows = len(df)
+        return df
+
+    def read_arrow(self, path, symbols=None, start=None, end=None, columns=None, compact=False):
+        with span("filter") as s:
+            df = ArrayFrame.from_arrow(filter_arrow_table(read_arrow_table(path), symbols, start, end, columns))
+            s.rows = len(df)
+        return df
+
+    def compact(self, data, float32=False):
+        # NumPy has no dictionary type; symbols become fixed-width unicode,
+        # which drops the per-row Python objects and compares without them.
+        columns = {name: data[name] for name in data.columns}
+        if "symbol" in columns and columns["symbol"].dtype == object:
+            columns["symbol"] = columns["symbol"].astype(str)
+        if TIMESTAMP_COLUMN in columns and columns[TIMESTAMP_COLUMN].dtype.kind != "i":
+            columns[TIMESTAMP_COLUMN] = timestamp_keys(columns[TIMESTAMP_COLUMN])
+        if float32 and "price" in columns:
+            columns["price"] = columns["price"].astype(np.float32)
+        return ArrayFrame(columns)
+
+    def memory_usage(self, data):
+        usage = {}
+        for name in data.columns:
+            values = data[name]
+            usage[name] = int(values.nbytes)
+            if values.dtype == object:
+                usage[name] += sum(sys.getsizeof(v) for v in values)
+        return usage
+
+    def _read_csv_table(self, filename, columns=None):
+        # Timestamps stay strings, as pandas and Polars read them. Explicit
+        # types also keep a header-only file from reading as null columns.
+        import pyarrow as pa
+        import pyarrow.csv as pv
+
+        types = {TIMESTAMP_COLUMN: pa.string(), "symbol": pa.large_string(), "price": pa.float64()}
+        convert = pv.ConvertOptions(column_types=types, include_columns=columns)
+        return pv.read_csv(filename, convert_options=convert)
+
+    def sort_by_symbol(self, data):
+        if "price" not in data.columns:
+            data = data.rename({data.columns[-1]: "price"})
+        return data.take(np.argsort(data["symbol"], kind="stable"))
+
+    def slice(self, data, start, stop):
+        return data.slice(start, stop)
+
+    def frame(self, columns):
+        return ArrayFrame(columns)
+
+    def iter_csv_batches(self, filename, batch_rows, symbols=None):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pv
+
+        # pyarrow batches by bytes; size blocks for roughly batch_rows rows.
+        read = pv.ReadOptions(block_size=max(1 << 16, batch_rows * 32))
+        convert = pv.ConvertOptions(include_columns=["symbol", "price"], column_types={"price": pa.float64()})
+        value_set = None if symbols is None else pa.array(list(symbols), pa.string())
+        for batch in pv.open_csv(filename, read_options=read, convert_options=convert):
+            if value_set is not None:
+                batch = batch.filter(pc.is_in(batch["symbol"], value_set=value_set))
+            yield batch["symbol"].to_numpy(zero_copy_only=False), batch["price"].to_numpy(zero_copy_only=False)
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib import metadata
+import numpy as np
+
+
+class BenchmarkStats:
+    def __init__(self, name, durations, cpu_times, peak_alloc_mb):
+        self.name = name
+        self.durations = list(durations)
+        self.cpu_times = list(cpu_times)
+        self.peak_alloc_mb = peak_alloc_mb
+
+    @property
+    def median(self):
+        return float(np.median(self.durations))
+
+    @property
+    def p95(self):
+        return float(np.percentile(self.durations, 95))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "repeat": len(self.durations),
+            "median_sec": self.median,
+            "p95_sec": self.p95,
+            "min_sec": float(np.min(self.durations)),
+            "cpu_sec": float(np.median(self.cpu_times)),
+            "peak_alloc_mb": self.peak_alloc_mb,
+        }
+
+
+def _cpu_time():
+    # os.times() children fields cover terminated, waited-for subprocesses,
+    # which includes process pool workers once the pool has shut down.
+    children = os.times()
+    return time.process_time() + children.children_user + children.children_system
+
+
+def run_benchmark(func, *args, name=None, warmup=1, repeat=5, track_memory=True, **kwargs):
+    # Warm-up runs absorb imports, caches and JIT-like first-call costs. Timed
+    # runs record wall time and CPU time of this process (all threads) plus
+    # any worker processes it reaped during the run; peak Python
+    # allocation is measured in one extra run, since tracemalloc itself slows
+    # the timed code down. Allocations made outside the Python allocator
+    # (e.g. inside Polars/Arrow) are not seen by tracemalloc.
+    name = name or getattr(func, "__name__", "benchmark")
+    result = None
+    for _ in range(warmup):
+        result = func(*args, **kwargs)
+
+    durations, cpu_times = [], []
+    for _ in range(repeat):
+        cpu_start = _cpu_time()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        durations.append(time.perf_counter() - start)
+        cpu_times.append(_cpu_time() - cpu_start)
+
+    peak_alloc_mb = None
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_alloc_mb = peak / (1024 ** 2)
+
+    return result, BenchmarkStats(name, durations, cpu_times, peak_alloc_mb)
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_metadata():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": metadata.version("pandas"),
+        "polars": metadata.version("polars"),
+        "git_commit": _git_commit(),
+    }
+
+
+def save_results(stats, path):
+    payload = {"environment": environment_metadata(), "results": [s.to_dict() for s in stats]}
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    return payload
+
+
+def compare_to_baseline(stats, baseline_path, threshold=0.10, metric="median_sec"):
+    with open(baseline_path, "r") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for s in stats:
+        current = s.to_dict()
+        previous = baseline.get(s.name)
+        if previous is None or not previous.get(metric):
+            continue
+        change = current[metric] / previous[metric] - 1
+        if change > threshold:
+            regressions.append(
+                {"name": s.name, "baseline": previous[metric], "current": current[metric], "change": change}
+            )
+    return regressions
+
+
+def standard_suite(json_path, csv_path, warmup=1, repeat=5, max_workers=4):
+    from metrics import rolling_ma_pd, rolling_ma_pl
+    from data_loader import load_price_data, index_price_data
+    from parallel import threading_pd, threading_pl
+    from portfolio import portfolio_from_file
+
+    stats = []
+    for backend in ("pandas", "polars", "numpy"):
+        for executor in ("sequential", "thread", "process", "batch"):
+            _, s = run_benchmark(
+                portfolio_from_file,
+                json_path,
+                csv_path,
+                backend=backend,
+                executor=executor,
+                max_workers=max_workers,
+                name=f"portfolio_from_file[{backend},{executor}]",
+                warmup=warmup,
+                repeat=repeat,
+            )
+            stats.append(s)
+
+    pandas_index = index_price_data(load_price_data(csv_path))
+    polars_index = index_price_data(load_price_data(csv_path, use_polars=True), use_polars=True)
+    for name, func, index, metric in (
+        ("threading_pd", threading_pd, pandas_index, rolling_ma_pd),
+        ("threading_pl", threading_pl, polars_index, rolling_ma_pl),
+    ):
+        _, s = run_benchmark(
+            func, metric, index, index.symbols, max_workers, name=name, warmup=warmup, repeat=repeat
+        )
+        stats.append(s)
+    return stats
+
+
+def scaling_sweep(
+    sizes,
+    output_dir="scaling",
+    backends=("pandas", "polars"),
+    executors=("sequential", "thread", "process", "batch"),
+    depth=2,
+    fan_out=4,
+    warmup=1,
+    repeat=3,
+    max_workers=4,
+    seed=0,
+):
+    # sizes is a list of (n_symbols, n_bars). Each size gets its own seeded
+    # data set and portfolio tree; throughput is reported per backend/executor.
+    import pandas as pd
+    from portfolio import portfolio_from_file
+    from synthetic import count_positions, write_market_data, write_portfolio_tree, symbol_names
+
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    for n_symbols, n_bars in sizes:
+        csv_path = os.path.join(output_dir, f"market_{n_symbols}x{n_bars}.csv")
+        json_path = os.path.join(output_dir, f"portfolio_{n_symbols}x{n_bars}.json")
+        n_rows = len(write_market_data(csv_path, n_symbols, n_bars, seed=seed, ragged=True))
+        per_node = max(1, n_symbols // sum(fan_out ** level for level in range(depth + 1)))
+        tree = write_portfolio_tree(
+            json_path,
+            symbol_names(n_symbols),
+            depth=depth,
+            fan_out=fan_out,
+            positions_per_node=per_node,
+            seed=seed,
+        )
+        n_positions = count_positions(tree)
+
+        for backend in backends:
+            for executor in executors:
+                _, stats = run_benchmark(
+                    portfolio_from_file,
+                    json_path,
+                    csv_path,
+                    backend=backend,
+                    executor=executor,
+                    max_workers=max_workers,
+                    name=f"portfolio_from_file[{backend},{executor},{n_symbols}x{n_bars}]",
+                    warmup=warmup,
+                    repeat=repeat,
+                    track_memory=False,
+                )
+                rows.append(
+                    {
+                        **stats.to_dict(),
+                        "backend": backend,
+                        "executor": executor,
+                        "rows": n_rows,
+                        "positions": n_positions,
+                        "rows_per_sec": n_rows / stats.median,
+                        "positions_per_sec": n_positions / stats.median,
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark portfolio construction and parallel helpers.")
+    parser.add_argument("--json", default="portfolio_structure-1.json")
+    parser.add_argument("--csv", default="market_data-1.csv")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--trace", default=None, help="write a Chrome trace of one portfolio build per executor")
+    parser.add_argument(
+        "--scaling",
+        nargs="*",
+        metavar="SYMBOLSxBARS",
+        help="run the synthetic scaling sweep instead, e.g. --scaling 100x252 1000x252",
+    )
+    args = parser.parse_args(argv)
+
+    if args.scaling is not None:
+        from reporting import plot_scaling
+
+        sizes = [tuple(int(v) for v in size.split("x")) for size in args.scaling or ["100x252", "1000x252"]]
+        df = scaling_sweep(sizes, warmup=args.warmup, repeat=args.repeat, max_workers=args.max_workers)
+        df.to_json(args.output, orient="records", indent=2)
+        print(df[["backend", "executor", "rows", "positions", "median_sec", "rows_per_sec"]].to_string(index=False))
+        print("Saved", ", ".join(plot_scaling(df)))
+        return 0
+
+    if args.trace:
+        from portfolio import portfolio_from_file
+        from tracing import tracing
+
+        with tracing() as tracer:
+            for executor in ("sequential", "thread", "process", "batch"):
+                portfolio_from_file(args.json, args.csv, executor=executor, max_workers=args.max_workers)
+        tracer.save(args.trace)
+        print(tracer.summary().to_string(index=False))
+        print("Saved", args.trace)
+        return 0
+
+    stats = standard_suite(args.json, args.csv, args.warmup, args.repeat, args.max_workers)
+    save_results(stats, args.output)
+    import pandas as pd
+
+    print(pd.DataFrame([s.to_dict() for s in stats]).to_string(index=False))
+
+    if args.baseline:
+        regressions = compare_to_baseline(stats, args.baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['name']}: {r['baseline']:.4f}s -> {r['current']:.4f}s ({r['change']:+.1%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
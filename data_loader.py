@@ -1,10 +1,243 @@
-from datetime import datetime
-import pandas as pd
-import polars as pl
+import hashlib
+import json
+import os
+import numpy as np
+from backends import TIMESTAMP_COLUMN, get_backend, timestamp_keys
+from tracing import span
 
-def load_price_data(filename, use_polars=False):
-    if use_polars:
+CACHE_DIR = ".price_cache"
+# How aligned_prices fills a symbol's missing dates: "ffill" carries the last
+# observed price forward (an as-of join), "nan" leaves the gap empty. Dates
+# before a symbol's first observation are NaN under either policy.
+FILL_POLICIES = ("ffill", "nan")
+
+
+def load_price_data(
+    filename,
+    use_polars=False,
+    cache=True,
+    symbols=None,
+    start=None,
+    end=None,
+    columns=None,
+    backend=None,
+    compact=False,
+    float32=False,
+):
+    # symbols/start/end restrict the rows that are read and columns the fields;
+    # with no restrictions the full table is returned as before. backend names
+    # the dataframe library ("pandas", "polars" or "numpy"); use_polars is the
+    # older spelling of backend="polars". compact keeps symbols as dictionary
+    # codes and timestamps as int64 nanoseconds; float32 (which implies
+    # compact) also stores prices in single precision.
+    backend = get_backend(backend, use_polars)
+    compact = compact or float32
+    with span("load_price_data") as s:
+        df = _load_price_data(filename, backend, cache, symbols, start, end, columns, compact)
+        if compact:
+            with span("compact"):
+                df = backend.compact(df, float32)
+        s.rows = len(df)
+    return df
+
+
+def _load_price_data(filename, backend, cache, symbols, start, end, columns, compact=False):
+    path = None
+    if cache:
+        try:
+            path = cached_price_file(filename)
+        except OSError:
+            path = None
+
+    filters = (symbols, start, end, columns)
+    if path is not None:
+        return backend.read_arrow(path, *filters, compact=compact)
+    if all(f is None for f in filters):
+        return backend.read_csv(filename)
+    return backend.read_csv_filtered(filename, *filters)
+
+
+def _file_digest(filename):
+    with open(filename, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def cached_price_file(filename, cache_dir=None):
+    # Converts the CSV to an uncompressed Arrow IPC file (symbol stored as a
+    # dictionary column) once. The cache is reused while the source's mtime and
+    # size are unchanged, or while its content hash still matches.
+    filename = os.path.abspath(filename)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(filename), CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    path = os.path.join(cache_dir, f"{stem}.arrow")
+    meta_path = os.path.join(cache_dir, f"{stem}.json")
+
+    stat = os.stat(filename)
+    meta = {"source": filename, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        with open(meta_path, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached is not None and os.path.exists(path) and cached.get("source") == filename:
+        if cached["mtime_ns"] == meta["mtime_ns"] and cached["size"] == meta["size"]:
+            return path
+        if cached["size"] == meta["size"]:
+            meta["sha256"] = _file_digest(filename)
+            if cached.get("sha256") == meta["sha256"]:
+                _write_json(meta_path, meta)
+                return path
+
+    meta.setdefault("sha256", _file_digest(filename))
+    os.makedirs(cache_dir, exist_ok=True)
+    # Polars is only imported when the cache has to be (re)built.
+    import polars as pl
+
+    with span("csv_to_arrow") as s:
         df = pl.read_csv(filename)
-    else:
-        df = pd.read_csv(filename)
-    return df
\ No newline at end of file
+        if "symbol" in df.columns:
+            df = df.with_columns(pl.col("symbol").cast(pl.Categorical))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.write_ipc(tmp_path, compression="uncompressed", compat_level=pl.CompatLevel.oldest())
+        s.rows = len(df)
+    os.replace(tmp_path, path)
+    _write_json(meta_path, meta)
+    return path
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_price_cache(path, use_polars=False, symbols=None, start=None, end=None, columns=None, backend=None):
+    return get_backend(backend, use_polars).read_arrow(path, symbols, start, end, columns)
+
+
+def memory_report(filename, use_polars=False, backend=None, float32=False, **kwargs):
+    # Per-column bytes of the price table loaded as-is and compacted, with
+    # the totals under "total".
+    backend = get_backend(backend, use_polars)
+    before = backend.memory_usage(load_price_data(filename, backend=backend, **kwargs))
+    after = backend.memory_usage(
+        load_price_data(filename, backend=backend, compact=True, float32=float32, **kwargs)
+    )
+    report = {name: {"before": before.get(name, 0), "after": after.get(name, 0)} for name in before}
+    report["total"] = {"before": sum(before.values()), "after": sum(after.values())}
+    return report
+
+
+class SymbolIndex:
+    # Sorts the long-format table by symbol once (stable, so each symbol keeps
+    # its time order) and records where every symbol's rows start and stop.
+    def __init__(self, price_data, use_polars=False, backend=None):
+        self.backend = get_backend(backend, use_polars)
+        with span("index", rows=len(price_data)):
+            self.data = self.backend.sort_by_symbol(price_data)
+        self.price_values = self.column("price")
+        starts, stops, symbols = self.backend.symbol_runs(self.data)
+        self.offsets = {symbol: (int(s), int(e)) for symbol, s, e in zip(symbols, starts, stops)}
+        self._calendar = None
+        self._aligned = {}
+
+    @property
+    def use_polars(self):
+        return self.backend.name == "polars"
+
+    def __contains__(self, symbol):
+        return symbol in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def symbols(self):
+        return list(self.offsets)
+
+    def get(self, symbol):
+        start, stop = self.offsets.get(symbol, (0, 0))
+        return self.backend.slice(self.data, start, stop)
+
+    def column(self, name):
+        return self.backend.column(self.data, name)
+
+    def prices(self, symbol):
+        start, stop = self.offsets.get(symbol, (0, 0))
+        return self.price_values[start:stop]
+
+    def price_matrix(self, symbols=None):
+        # Dense (time x symbol) prices, each column holding one symbol's history
+        # from row 0 and padded with NaN after its last observation.
+        return self.column_matrix("price", symbols)
+
+    def _gather(self, symbols):
+        # For the rows of symbols in order: each row's position in the index
+        # and its column (symbol number), plus the per-symbol row counts.
+        bounds = np.array([self.offsets.get(s, (0, 0)) for s in symbols], dtype=int).reshape(-1, 2)
+        lengths = bounds[:, 1] - bounds[:, 0]
+        cols = np.repeat(np.arange(len(symbols)), lengths)
+        rows = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return rows + np.repeat(bounds[:, 0], lengths), cols, lengths
+
+    def calendar(self):
+        # Union of every timestamp in the index in chronological order (as
+        # the original labels) and each row's position in it, computed once.
+        # Labels that do not parse as timestamps keep their sorted order.
+        if self._calendar is None:
+            with span("calendar", rows=len(self.price_values)):
+                labels = self.column(TIMESTAMP_COLUMN)
+                try:
+                    keys = timestamp_keys(labels)
+                except (ValueError, TypeError):
+                    keys = labels
+                _, first, positions = np.unique(keys, return_index=True, return_inverse=True)
+                self._calendar = (labels[first], positions)
+        return self._calendar
+
+    def aligned_prices(self, symbols=None, fill="ffill"):
+        # Read-only, C-contiguous (time x symbol) float64 prices on the shared
+        # calendar, with gaps filled per fill (see FILL_POLICIES), and the
+        # calendar itself. Rows are placed with one scatter over all requested
+        # symbols; results are cached per (symbols, fill). Symbols not in the
+        # index are all-NaN columns.
+        if fill not in FILL_POLICIES:
+            raise ValueError(f"Unknown fill policy {fill!r}; expected one of {FILL_POLICIES}")
+        symbols = tuple(self.symbols if symbols is None else symbols)
+        key = (symbols, fill)
+        if key not in self._aligned:
+            calendar, positions = self.calendar()
+            with span("aligned_prices", rows=len(calendar) * len(symbols)):
+                source, cols, _ = self._gather(symbols)
+                prices = np.full((len(calendar), len(symbols)), np.nan)
+                prices[positions[source], cols] = self.price_values[source]
+                if fill == "ffill":
+                    rows = np.where(np.isnan(prices), 0, np.arange(len(prices))[:, None])
+                    np.maximum.accumulate(rows, axis=0, out=rows)
+                    prices = prices[rows, np.arange(len(symbols))]
+            prices.setflags(write=False)
+            self._aligned[key] = (prices, calendar)
+        return self._aligned[key]
+
+    def column_matrix(self, column, symbols=None):
+        symbols = self.symbols if symbols is None else list(symbols)
+        source, cols, lengths = self._gather(symbols)
+        values = self.price_values if column == "price" else self.column(column)
+        if values.dtype.kind in "fc":
+            fill, dtype = np.nan, float
+        elif values.dtype.kind in "mM":
+            fill, dtype = np.datetime64("NaT"), values.dtype
+        else:
+            fill, dtype = None, object
+        matrix = np.full((int(lengths.max(initial=0)), len(symbols)), fill, dtype=dtype, order="F")
+        rows = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        matrix[rows, cols] = values[source]
+        return matrix
+
+
+def index_price_data(price_data, use_polars=False, backend=None):
+    if isinstance(price_data, SymbolIndex):
+        return price_data
+    return SymbolIndex(price_data, use_polars=use_polars, backend=backend)
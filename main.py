@@ -2,6 +2,7 @@ import os
 import json
 from portfolio import portfolio_from_file
 from reporting import (
+    FIGURE_DIR,
     compare_ingestion_times,
     compare_rolling_metrics,
     compare_parallel_execution,
@@ -57,6 +58,7 @@ def main():
     print("\nThreaded (Polars) Portfolio:")
     print(json.dumps(portfolio_pl.to_dict(), indent=2))
 
+    print(f"\nFigures saved to {FIGURE_DIR}/")
     print("\n✅ Benchmarking complete.\n")
 
 
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def fingerprint(prices):
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    return hashlib.blake2b(prices.tobytes(), digest_size=16).hexdigest()
+
+
+class MetricCache:
+    # Bounded LRU of per-symbol (volatility, drawdown) results keyed by
+    # (symbol, fingerprint of the symbol's prices, metric parameters), so the
+    # same history is only computed once across sub-portfolios, builders and
+    # portfolio files. Safe to share between threads.
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(symbol, prices, params=()):
+        return (symbol, fingerprint(prices), tuple(params))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = tuple(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def save(self, path):
+        with self._lock:
+            rows = [
+                [symbol, fp, list(params), *map(float, value)]
+                for (symbol, fp, params), value in self._entries.items()
+            ]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, max_entries=100_000):
+        cache = cls(max_entries)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for symbol, fp, params, *value in json.load(f):
+                    cache.put((symbol, fp, tuple(params)), value)
+        return cache
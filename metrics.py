@@ -1,28 +1,200 @@
-import pandas as pd
-import polars as pl
+import warnings
+from typing import TYPE_CHECKING
 import numpy as np
+from data_loader import index_price_data, TIMESTAMP_COLUMN
+from tracing import span
 
-def rolling_ma_pd(series: pd.Series, window=20) -> pd.Series:
+if TYPE_CHECKING:
+    import pandas as pd
+    import polars as pl
+
+def rolling_ma_pd(series: "pd.Series", window=20) -> "pd.Series":
     return series.rolling(window=window, min_periods=window).mean()
 
-def rolling_ma_pl(series: pl.Series, window=20) -> pl.Series:
+def rolling_ma_pl(series: "pl.Series", window=20) -> "pl.Series":
     return series.rolling_mean(window_size=window)
 
-def rolling_sd_pd(series: pl.Series, window=20) -> pl.Series:
-    return series.rolling(window=window).std()
+def rolling_sd_pd(series: "pd.Series", window=20) -> "pd.Series":
+    return series.rolling(window=window, min_periods=window).std()
 
-def rolling_sd_pl(series: pl.Series, window=20) -> pl.Series:
+def rolling_sd_pl(series: "pl.Series", window=20) -> "pl.Series":
     return series.rolling_std(window_size=window)
 
-def rolling_sharpe_pd(series: pd.Series, window=20) -> pd.Series:
-    rolling_mean = rolling_ma_pd(series, window)
-    rolling_std = rolling_sd_pd(series, window)
-    return rolling_mean / rolling_std
+def rolling_sharpe_pd(series: "pd.Series", window=20) -> "pd.Series":
+    import pandas as pd
+
+    _, _, sharpe = rolling_moments(series.to_numpy(dtype=float), window)
+    return pd.Series(sharpe, index=series.index, name=series.name)
+
+def rolling_sharpe_pl(series: "pl.Series", window=20) -> "pl.Series":
+    import polars as pl
+
+    _, _, sharpe = rolling_moments(series.cast(pl.Float64).to_numpy(), window)
+    return pl.Series(series.name, sharpe, nan_to_null=True)
+
+
+def _prefix_sums(values):
+    prefix = np.cumsum(values, axis=0)
+    return np.concatenate([np.zeros_like(prefix[:1]), prefix], axis=0)
+
+
+def _window_diff(prefix, window):
+    # Per-window sums from a prefix sum with a leading zero row.
+    sums = np.empty_like(prefix[1:])
+    sums[:window] = prefix[1:window + 1]
+    sums[window:] = prefix[window + 1:] - prefix[1:-window]
+    return sums
+
+
+def _window_sums(values, window):
+    return _window_diff(_prefix_sums(values), window)
+
+
+def _flat_runs(values, valid):
+    # Per column: the last valid value at or before each row, the first valid
+    # row at or after it (len(values) if none), whether each valid value
+    # differs from the previous valid one (the first always does), and the
+    # prefix sums of those changes.
+    n = len(values)
+    rows = np.arange(n)[:, None]
+    columns = np.arange(values.shape[1])
+    last = np.where(valid, rows, 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    last_value = np.where(np.cumsum(valid, axis=0) > 0, values[last, columns], np.nan)
+
+    first_valid = np.where(valid, rows, n)
+    first_valid = np.minimum.accumulate(first_valid[::-1], axis=0)[::-1]
+
+    previous = np.vstack([np.full((1, values.shape[1]), np.nan), last_value[:-1]])
+    change = (valid & ~(values == previous)).astype(float)
+    return last_value, first_valid, change, _prefix_sums(change)
+
+
+def rolling_moments(values, window=20, min_periods=None):
+    # Rolling mean, ddof=1 std and mean/std over the trailing window of a 1-D
+    # series or of every column of a (time x symbol) array, in one pass of
+    # prefix sums. NaNs are skipped; windows with fewer than min_periods valid
+    # observations (default: window) are NaN, matching pandas rolling().
+    return rolling_sweep(values, [window], min_periods)[window]
+
+
+def rolling_sweep(values, windows, min_periods=None):
+    # rolling_moments for several windows at once. The prefix sums are built
+    # once and every window is a difference of them, so each extra window
+    # costs one pass over the output rather than a fresh rolling computation.
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    if len(values) == 0:
+        empty = values[:, 0] if squeeze else values
+        return {w: (empty.copy(), empty.copy(), empty.copy()) for w in windows}
+
+    valid = ~np.isnan(values)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        center = np.nan_to_num(np.nanmean(values, axis=0))
+    # Centering each column keeps the sum-of-squares cancellation small.
+    centered = np.where(valid, values - center, 0.0)
+    count_prefix = _prefix_sums(valid.astype(float))
+    sum_prefix = _prefix_sums(centered)
+    square_prefix = _prefix_sums(centered * centered)
+    last_value, first_valid, change, change_prefix = _flat_runs(values, valid)
+    columns = np.arange(values.shape[1])
+
+    results = {}
+    for window in windows:
+        periods = window if min_periods is None else min_periods
+        width = min(window, len(values))
+        counts = _window_diff(count_prefix, width)
+        sums = _window_diff(sum_prefix, width)
+        squares = _window_diff(square_prefix, width)
+
+        # A window is flat when no valid value in it differs from the one
+        # before it, not counting the window's first valid value.
+        starts = np.maximum(np.arange(len(values)) - width + 1, 0)
+        first = first_valid[starts]
+        inside = first < len(values)
+        leading = np.where(inside, change[np.minimum(first, len(values) - 1), columns], 0.0)
+        flat = (counts > 0) & (_window_diff(change_prefix, width) - leading == 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sums / counts
+            var = np.maximum(squares - sums * mean, 0.0) / (counts - 1)
+            # Prefix-sum differences leave rounding residue on flat windows;
+            # give them the exact value and zero variance, as pandas does.
+            mean = np.where(flat, last_value - center, mean)
+            var = np.where(flat & (counts > 1), 0.0, var)
+            std = np.sqrt(var)
+            mean = mean + center
+            sharpe = mean / std
+
+        enough = counts >= max(periods, 1)
+        mean[~enough] = np.nan
+        std[~(enough & (counts > 1))] = np.nan
+        sharpe[np.isnan(std)] = np.nan
+        if squeeze:
+            mean, std, sharpe = mean[:, 0], std[:, 0], sharpe[:, 0]
+        results[window] = (mean, std, sharpe)
+    return results
+
+
+def rolling_sweep_frame(price_data, windows, symbols=None, use_polars=False, backend=None):
+    # Tidy (symbol, window, timestamp) rolling mean/std/Sharpe of each symbol's
+    # returns, for every window in one sweep.
+    index = index_price_data(price_data, use_polars, backend)
+    symbols = index.symbols if symbols is None else [s for s in symbols if s in index]
+    prices = index.price_matrix(symbols)
+    timestamps = index.column_matrix(TIMESTAMP_COLUMN, symbols)
+    returns = np.full_like(prices, np.nan)
+    returns[1:] = prices[1:] / prices[:-1] - 1
+
+    lengths = np.array([index.offsets[s][1] - index.offsets[s][0] for s in symbols], dtype=int)
+    present = (np.arange(len(prices))[:, None] < lengths).ravel(order="F")
+    symbol_col = np.repeat(np.asarray(symbols, dtype=object), len(prices))[present]
+    time_col = timestamps.ravel(order="F")[present]
 
-def rolling_sharpe_pl(series: pl.Series, window=20) -> pl.Series:
-    rolling_mean = rolling_ma_pl(series, window)
-    rolling_std = rolling_sd_pl(series, window)
-    return rolling_mean / rolling_std
+    columns = {"symbol": [], "window": [], TIMESTAMP_COLUMN: [], "mean": [], "std": [], "sharpe": []}
+    for window, (mean, std, sharpe) in rolling_sweep(returns, windows).items():
+        columns["symbol"].append(symbol_col)
+        columns["window"].append(np.full(len(symbol_col), window))
+        columns[TIMESTAMP_COLUMN].append(time_col)
+        columns["mean"].append(mean.ravel(order="F")[present])
+        columns["std"].append(std.ravel(order="F")[present])
+        columns["sharpe"].append(sharpe.ravel(order="F")[present])
+    columns = {k: np.concatenate(v) if v else np.array([]) for k, v in columns.items()}
+
+    return index.backend.frame(columns)
+
+
+def rolling_max_drawdown(returns, window=20, min_periods=None, block_elements=4_000_000):
+    # Max drawdown of every trailing window of returns, as compute_max_drawdown
+    # would report for that window alone. Works in log-wealth so the running
+    # ratio wealth/peak never over- or underflows on long histories.
+    returns = np.asarray(returns, dtype=float)
+    squeeze = returns.ndim == 1
+    if squeeze:
+        returns = returns[:, None]
+    n, cols = returns.shape
+    min_periods = window if min_periods is None else min_periods
+    out = np.full((n, cols), np.nan)
+    if n < window or n == 0:
+        return out[:, 0] if squeeze else out
+
+    valid = ~np.isnan(returns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_wealth = np.cumsum(np.where(valid, np.log1p(returns), 0.0), axis=0)
+    windows = np.lib.stride_tricks.sliding_window_view(log_wealth, window, axis=0)
+    counts = _window_sums(valid.astype(float), window)[window - 1:]
+
+    step = max(1, block_elements // max(cols * window, 1))
+    for start in range(0, len(windows), step):
+        block = windows[start:start + step]
+        peaks = np.maximum.accumulate(block, axis=-1)
+        out[window - 1 + start:window - 1 + start + len(block)] = np.expm1(np.min(block - peaks, axis=-1))
+
+    out[window - 1:][counts < max(min_periods, 1)] = np.nan
+    return out[:, 0] if squeeze else out
 
 def compute_volatility(returns, annualize=False, freq=252):
     returns = np.asarray(returns, dtype=float)
@@ -33,10 +205,147 @@ def compute_volatility(returns, annualize=False, freq=252):
         vol *= np.sqrt(freq)
     return vol
 
-def compute_max_drawdown(returns):
+def compute_max_drawdown(returns, axis=-1):
+    # axis selects the time axis when returns holds many series, e.g. a
+    # (paths x horizon x node) block of simulated returns.
     if len(returns) == 0:
         return np.nan
-    cumulative = np.cumprod(1 + np.asarray(returns, dtype=float))
-    peaks = np.maximum.accumulate(cumulative)
+    cumulative = np.cumprod(1 + np.asarray(returns, dtype=float), axis=axis)
+    peaks = np.maximum.accumulate(cumulative, axis=axis)
     drawdowns = cumulative / peaks - 1
-    return np.nanmin(drawdowns)
\ No newline at end of file
+    return np.nanmin(drawdowns, axis=axis)
+
+def compute_batch_metrics(prices):
+    prices = np.asarray(prices, dtype=float)
+    if prices.ndim != 2 or prices.shape[0] < 2:
+        n = prices.shape[1] if prices.ndim == 2 else 0
+        return np.full(n, np.nan), np.full(n, np.nan)
+    with span("batch_metrics", rows=prices.size):
+        return _batch_metrics(prices)
+
+
+def _batch_metrics(prices):
+    returns = prices[1:] / prices[:-1] - 1
+    counts = np.count_nonzero(~np.isnan(returns), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        vols = np.nanstd(returns, axis=0, ddof=1)
+
+    # NaN gaps and padding count as a zero return, which leaves wealth (and so
+    # the drawdown) exactly as if the missing returns had been dropped. Rows
+    # before a column's first valid return are left out, so the starting
+    # wealth of 1 never becomes a peak the dropped-returns path would not have.
+    cumulative = np.nancumprod(1 + returns, axis=0)
+    cumulative[np.arange(len(returns))[:, None] < np.argmax(~np.isnan(returns), axis=0)] = np.nan
+    peaks = np.fmax.accumulate(cumulative, axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        dds = np.nanmin(cumulative / peaks - 1, axis=0)
+
+    vols[counts == 0] = np.nan
+    dds[counts == 0] = np.nan
+    return vols, dds
+
+
+def compute_batch_metrics_pl(df: "pl.DataFrame") -> "pl.DataFrame":
+    with span("batch_metrics", rows=len(df)):
+        return _batch_metrics_pl(df)
+
+
+def _batch_metrics_pl(df):
+    import polars as pl
+
+    returns = df.select(
+        pl.col("symbol"),
+        pl.col("price").cast(pl.Float64).pct_change().over("symbol").alias("returns"),
+    )
+    # Missing prices give NaN (not null) returns; drop both, as the NumPy and
+    # pandas paths do.
+    returns = returns.with_columns(pl.col("returns").fill_nan(None)).drop_nulls("returns")
+    wealth = (1 + pl.col("returns")).cum_prod()
+    drawdowns = (wealth / wealth.cum_max() - 1).over("symbol")
+    stats = (
+        returns.with_columns(drawdowns.alias("drawdown"))
+        .group_by("symbol", maintain_order=True)
+        .agg(
+            pl.col("returns").std(ddof=1).alias("volatility"),
+            pl.col("drawdown").min(),
+        )
+    )
+    return (
+        df.select(pl.col("symbol").unique(maintain_order=True))
+        .join(stats, on="symbol", how="left", maintain_order="left")
+        .with_columns(pl.col("volatility", "drawdown").fill_null(np.nan))
+    )
+
+
+class RunningMetrics:
+    # Constant-memory volatility and drawdown state for one price stream.
+    # Return moments use Welford/Chan updates; wealth is chained through each
+    # batch in the same order as compute_max_drawdown's cumprod.
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.wealth = 1.0
+        self.peak = -np.inf
+        self.min_drawdown = np.inf
+        self.last_price = None
+
+    def update(self, prices):
+        prices = np.asarray(prices, dtype=float)
+        if len(prices) == 0:
+            return self
+        if self.last_price is not None:
+            prices = np.r_[self.last_price, prices]
+        self.last_price = prices[-1]
+        returns = prices[1:] / prices[:-1] - 1
+        returns = returns[~np.isnan(returns)]
+        n = len(returns)
+        if n == 0:
+            return self
+
+        mean = returns.mean()
+        m2 = np.sum((returns - mean) ** 2)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        cumulative = np.cumprod(np.r_[self.wealth, 1 + returns])[1:]
+        peaks = np.maximum.accumulate(np.maximum(cumulative, self.peak))
+        self.min_drawdown = min(self.min_drawdown, np.min(cumulative / peaks - 1))
+        self.wealth = cumulative[-1]
+        self.peak = peaks[-1]
+        return self
+
+    def push(self, price):
+        # Scalar fast path for a single new bar.
+        price = float(price)
+        last, self.last_price = self.last_price, price
+        if last is None:
+            return self
+        r = price / last - 1 if last != 0 else np.nan
+        if r != r:
+            return self
+        self.count += 1
+        delta = r - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (r - self.mean)
+        self.wealth *= 1 + r
+        self.peak = max(self.peak, self.wealth)
+        self.min_drawdown = min(self.min_drawdown, self.wealth / self.peak - 1)
+        return self
+
+    @property
+    def volatility(self):
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    @property
+    def drawdown(self):
+        if self.count == 0:
+            return np.nan
+        return self.min_drawdown
@@ -1,100 +1,93 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed, ProcessPoolExecutor
-import pandas as pd
-import polars as pl
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING
+import numpy as np
+from data_loader import index_price_data
+from metrics import compute_volatility, compute_max_drawdown
+from tracing import Tracer, enabled, record_spans, span
 
+if TYPE_CHECKING:
+    import pandas as pd
+    import polars as pl
 
-def threading_pd(metric, df: pd.DataFrame, symbols: list, max_workers=4):
-    transformed = []
 
-    for symbol in symbols:
-        symbol_data = df.loc[df['symbol'] == symbol, 'price'].reset_index(drop=True)
-        transformed.append(symbol_data)
-    
-    df_new = pd.concat(transformed, axis=1)
-    df_new.columns = symbols
+def _traced_metric(metric, symbol, series, window):
+    with span("thread_metric", symbol, len(series)):
+        return metric(series, window)
 
-    window = 20
-    results = []
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-        executor.submit(metric, df_new[symbol], window): symbol
-        for symbol in df_new.columns
-    }
+def wide_prices_pd(index, symbols, fill="nan") -> "pd.DataFrame":
+    # (time x symbol) prices on the index's shared calendar, wrapping the
+    # cached aligned array; fill is one of data_loader.FILL_POLICIES.
+    import pandas as pd
 
-    for future in as_completed(futures):
-        symbol = futures[future]
-        result = future.result()
-        results.append(result)
+    prices, _ = index.aligned_prices(symbols, fill)
+    return pd.DataFrame(prices, columns=list(symbols), copy=False)
 
-    final_df = pd.concat(results, axis =1, ignore_index=True)
 
+def wide_prices_pl(index, symbols, fill="nan") -> "pl.DataFrame":
+    # As wide_prices_pd; gaps are nulls, which Polars' rolling windows skip
+    # over the way pandas skips NaN.
+    import polars as pl
 
-def threading_pl(metric, df: pl.DataFrame, symbols: list, max_workers=4):
-    transformed = {}
+    prices, _ = index.aligned_prices(symbols, fill)
+    return pl.DataFrame({s: prices[:, j] for j, s in enumerate(symbols)}, nan_to_null=True)
 
-    for symbol in symbols:
-        symbol_data = (
-            df.filter(pl.col("symbol") == symbol)
-              .select(pl.col("price"))
-              .to_series()
-        )
-        transformed[symbol] = symbol_data
 
-    df_new = pl.DataFrame(transformed)
+def threading_pd(metric, df: "pd.DataFrame", symbols: list, max_workers=4, window=20, fill="nan"):
+    import pandas as pd
 
-    window = 20
-    results = []
+    index = index_price_data(df, use_polars=False)
+    df_new = wide_prices_pd(index, symbols, fill)
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(metric, df_new[symbol], window): symbol
+        futures = [
+            executor.submit(_traced_metric, metric, symbol, df_new[symbol], window)
             for symbol in df_new.columns
-        }
-
-        for future in as_completed(futures):
-            symbol = futures[future]
-            result = future.result()
-            results.append(result.rename(symbol))
-
-    final_df = pl.DataFrame().hstack(results)
+        ]
+        # collected in symbol order, not completion order
+        results = [future.result() for future in futures]
 
+    final_df = pd.concat(results, axis=1, ignore_index=True)
     return final_df
 
-def multiprocessing_pd(metric, df: pd.DataFrame, symbols: list, max_workers=4):
-    transformed = []
-
-    for symbol in symbols:
-        symbol_data = df.loc[df['symbol'] == symbol, 'price'].reset_index(drop=True)
-        transformed.append(symbol_data)
 
-    df_new = pd.concat(transformed, axis=1)
-    df_new.columns = symbols
+def threading_pl(metric, df: "pl.DataFrame", symbols: list, max_workers=4, window=20, fill="nan"):
+    import polars as pl
 
-    results = []
+    index = index_price_data(df, use_polars=True)
+    df_new = wide_prices_pl(index, symbols, fill)
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(metric, df_new[symbol]): symbol
+            executor.submit(_traced_metric, metric, symbol, df_new[symbol], window): symbol
             for symbol in df_new.columns
         }
+        results = [future.result().rename(symbol) for future, symbol in futures.items()]
 
-        for future in as_completed(futures):
-            symbol = futures[future]
-            result = future.result()
-            results.append(result)
+    final_df = pl.DataFrame(results)
+
+    return final_df
+
+def multiprocessing_pd(metric, df: "pd.DataFrame", symbols: list, max_workers=4, fill="nan"):
+    import pandas as pd
+
+    index = index_price_data(df, use_polars=False)
+    df_new = wide_prices_pd(index, symbols, fill)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(metric, df_new[symbol]) for symbol in df_new.columns]
+        results = [future.result() for future in futures]
 
     final_df = pd.concat(results, axis=1, ignore_index=True)
     return final_df
 
 
-def multiprocessing_pl(metric, df: pl.DataFrame, symbols: list, max_workers=4):
-    transformed = {}
-    for symbol in symbols:
-        symbol_data = df.filter(pl.col("symbol") == symbol)["price"]
-        transformed[symbol] = symbol_data
+def multiprocessing_pl(metric, df: "pl.DataFrame", symbols: list, max_workers=4, fill="nan"):
+    import polars as pl
 
-    df_new = pl.DataFrame(transformed)
+    index = index_price_data(df, use_polars=True)
+    df_new = wide_prices_pl(index, symbols, fill)
 
     results = []
 
@@ -104,14 +97,15 @@ def multiprocessing_pl(metric, df: pl.DataFrame, symbols: list, max_workers=4):
             for symbol in df_new.columns
         }
 
-        for future in as_completed(futures):
-            symbol = futures[future]
+        for future, symbol in futures.items():
             result = future.result()
 
             if isinstance(result, pl.DataFrame):
                 result = result.rename({col: f"{symbol}_{col}" for col in result.columns})
             elif isinstance(result, pl.Series):
-                result = result.rename(symbol)
+                # Series only concat vertically; as one-column frames they
+                # line up side by side
+                result = result.rename(symbol).to_frame()
 
             results.append(result)
 
@@ -119,3 +113,76 @@ def multiprocessing_pl(metric, df: pl.DataFrame, symbols: list, max_workers=4):
     return final_df
 
 
+class SharedPriceBuffer:
+    # Copies a float64 price column into shared memory once; worker processes
+    # attach to it by name instead of receiving pickled slices.
+    def __init__(self, values):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        self.length = len(values)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=self.shm.buf)[:] = values
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _slice_metrics(prices, symbol, start, stop):
+    window = prices[start:stop]
+    returns = window[1:] / window[:-1] - 1
+    returns = returns[~np.isnan(returns)]
+    return symbol, float(compute_volatility(returns)), float(compute_max_drawdown(returns))
+
+
+def shared_symbol_metrics(shm_name, length, tasks, trace=False):
+    # Returns (results, spans); with trace set the worker times each symbol
+    # with a Tracer of its own and ships the spans back to the parent.
+    tracer = Tracer() if trace else None
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        prices = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+        results = []
+        for symbol, start, stop in tasks:
+            if tracer is None:
+                results.append(_slice_metrics(prices, symbol, start, stop))
+                continue
+            with tracer.span("process_metric", symbol, stop - start):
+                results.append(_slice_metrics(prices, symbol, start, stop))
+        del prices
+    finally:
+        shm.close()
+    return results, tracer.spans if tracer is not None else []
+
+
+def multiprocessing_metrics(index, symbols, max_workers=4, chunksize=None):
+    tasks = [(s, *index.offsets[s]) for s in symbols if s in index]
+    if not tasks:
+        return {}
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (max_workers * 4))
+    chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+
+    metrics = {}
+    trace = enabled()
+    with SharedPriceBuffer(index.price_values) as buffer:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(shared_symbol_metrics, buffer.name, buffer.length, chunk, trace)
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                results, spans = future.result()
+                record_spans(spans)
+                for symbol, vol, dd in results:
+                    metrics[symbol] = (vol, dd)
+    return metrics
@@ -1,57 +1,286 @@
 import json
 import numpy as np
-import pandas as pd
-import polars as pl
 from concurrent.futures import ThreadPoolExecutor
-from data_loader import load_price_data
-from metrics import compute_volatility, compute_max_drawdown
+from backends import get_backend
+from data_loader import load_price_data, index_price_data
+from parallel import multiprocessing_metrics
+from streaming import stream_metrics
+from stress import stress_table
+from tracing import span
+from position_table import PositionTable
+from risk import CovarianceEngine, WhatIfEvaluator, aligned_returns, exposure_matrix, tail_risk
+from metrics import (
+    compute_volatility,
+    compute_max_drawdown,
+    RunningMetrics,
+)
+
+METRIC_PARAMS = ("returns=pct_change", "volatility=std,ddof=1", "drawdown=max")
 
 
 class Position:
+    # A view onto one row of a PositionTable. Standalone positions get a
+    # private one-row table; positions built from a portfolio tree share the
+    # tree's table. Price history in data is released once metrics exist.
+    __slots__ = ("_table", "_row", "data")
+
     def __init__(self, symbol, quantity, price, data=None):
-        self.symbol = symbol
-        self.quantity = quantity
-        self.price = price
+        self._table = PositionTable([symbol], [quantity], [price])
+        self._row = 0
         self.data = data
-        self.value = quantity * price
-        self.volatility = None
-        self.drawdown = None
 
-    def compute_metrics(self, use_polars=False):
-        if self.data is None or len(self.data) == 0:
+    @classmethod
+    def view(cls, table, row, data=None):
+        p = cls.__new__(cls)
+        p._table = table
+        p._row = row
+        p.data = data
+        return p
+
+    @property
+    def symbol(self):
+        return self._table.symbols[self._table.symbol_ids[self._row]]
+
+    @property
+    def quantity(self):
+        return float(self._table.quantity[self._row])
+
+    @property
+    def price(self):
+        return float(self._table.price[self._row])
+
+    @property
+    def value(self):
+        return float(self._table.value[self._row])
+
+    @property
+    def volatility(self):
+        if not self._table.has_metrics[self._row]:
+            return None
+        return self._table.volatility[self._row]
+
+    @volatility.setter
+    def volatility(self, value):
+        self._table.set_metrics(self._row, value, self._table.drawdown[self._row])
+
+    @property
+    def drawdown(self):
+        if not self._table.has_metrics[self._row]:
+            return None
+        return self._table.drawdown[self._row]
+
+    @drawdown.setter
+    def drawdown(self, value):
+        self._table.drawdown[self._row] = np.nan if value is None else value
+
+    def compute_metrics(self, use_polars=False, backend=None):
+        metrics = price_metrics(self.symbol, self.data, get_backend(backend, use_polars))
+        if metrics is None:
             return
-        if use_polars:
-            returns = self.data.select(pl.col("price").pct_change().drop_nulls())["price"].to_numpy()
-        else:
-            returns = self.data["price"].pct_change().dropna().values
-        self.volatility = compute_volatility(returns)
-        self.drawdown = compute_max_drawdown(returns)
+        self._table.set_metrics(self._row, *metrics)
+        self.data = None
 
 
 class Portfolio:
+    # Node aggregates live in a PositionTable shared by the whole tree when
+    # the portfolio is built from JSON; assigning positions directly gives the
+    # node a table of its own.
+    __slots__ = (
+        "name",
+        "owner",
+        "sub_portfolios",
+        "symbol_states",
+        "price_index",
+        "stream_report",
+        "_table",
+        "_node",
+        "_positions",
+        "_tables",
+    )
+
     def __init__(self, name, owner=None, positions=None, sub_portfolios=None):
         self.name = name
         self.owner = owner
-        self.positions = positions or []
         self.sub_portfolios = sub_portfolios or []
-        self.total_value = None
-        self.aggregate_volatility = None
-        self.max_drawdown = None
+        self.symbol_states = {}
+        self.price_index = None
+        self.stream_report = None
+        self._tables = None
+        self.positions = positions or []
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = [Position.view(self._table, row) for row in self._table.node_rows(self._node)]
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions):
+        table = PositionTable(
+            [p.symbol for p in positions], [p.quantity for p in positions], [p.price for p in positions]
+        )
+        for row, p in enumerate(positions):
+            table.set_metrics(row, p.volatility, p.drawdown)
+        self._table, self._node, self._tables = table, 0, None
+        self._positions = [Position.view(table, row, p.data) for row, p in enumerate(positions)]
+
+    @property
+    def total_value(self):
+        return self._node_metric(self._table.total_value)
+
+    @property
+    def aggregate_volatility(self):
+        return self._node_metric(self._table.aggregate_volatility)
+
+    @property
+    def max_drawdown(self):
+        return self._node_metric(self._table.max_drawdown)
+
+    @property
+    def covariance_volatility(self):
+        value = self._table.covariance_volatility[self._node]
+        return None if np.isnan(value) else value
+
+    def compute_covariance_metrics(self, engine=None):
+        # True sqrt(w^T Sigma w) volatility for every node of this portfolio's
+        # table in one batched product; the engine is built from the price
+        # index the portfolio was constructed from unless one is supplied.
+        if engine is None:
+            engine = CovarianceEngine.from_price_data(self._require_price_index("engine"), self._table.symbols)
+        self._table.covariance_volatility[:] = engine.node_volatility(self._table)
+        return engine
+
+    def _require_price_index(self, argument):
+        # Streamed portfolios (and sub-portfolios split off a table) keep no
+        # price index, so history-based risk needs it supplied explicitly.
+        if self.price_index is None:
+            raise ValueError(
+                f"Portfolio {self.name!r} has no price index (e.g. built with executor='stream'); "
+                f"pass {argument} explicitly"
+            )
+        return self.price_index
+
+    @property
+    def tail_risk(self):
+        # {"value_at_risk": {confidence: loss}, "expected_shortfall": {...}}
+        # for this node, or None until compute_tail_risk has run.
+        table = self._table
+        if not table.tail_confidence:
+            return None
+        return {
+            name: {f"{c:g}": float(v) for c, v in zip(table.tail_confidence, values[self._node])}
+            for name, values in [
+                ("value_at_risk", table.value_at_risk),
+                ("expected_shortfall", table.expected_shortfall),
+            ]
+        }
+
+    def compute_tail_risk(self, confidence=(0.95, 0.99), bootstrap=0, seed=0, returns=None):
+        # Historical (or bootstrapped) one-period VaR and ES in currency for
+        # every node of the table at once; returns is an optional precomputed
+        # (returns, symbols) pair from aligned_returns.
+        table = self._table
+        if returns is None:
+            returns, symbols, _ = aligned_returns(self._require_price_index("returns"), table.symbols)
+        else:
+            returns, symbols = returns
+        exposures = exposure_matrix(table, symbols)
+        var, es = tail_risk(returns, exposures, confidence, bootstrap=bootstrap, seed=seed)
+        table.tail_confidence = tuple(confidence)
+        table.value_at_risk, table.expected_shortfall = var, es
+        return var, es
+
+    def what_if(self, quantities, chunk=None, returns=None):
+        # Value, aggregate volatility and drawdown of this portfolio for every
+        # row of a (candidates x positions) quantity matrix, with positions in
+        # self.positions order; see WhatIfEvaluator.evaluate. returns is an
+        # optional (returns, symbols) pair from aligned_returns.
+        if returns is None:
+            returns = aligned_returns(self._require_price_index("returns"), self._table.symbols)[:2]
+        evaluator = WhatIfEvaluator.from_table(self._table, self._node, *returns)
+        return evaluator.evaluate(quantities, chunk=chunk)
+
+    def stress_test(
+        self, n_paths=10_000, horizon=20, method="bootstrap", max_workers=4, seed=0, returns=None, **kwargs
+    ):
+        # Monte Carlo drawdown and terminal-value distributions for every node
+        # of the table, simulated in worker processes; see stress.run_stress.
+        # returns is an optional (returns, symbols) pair from aligned_returns.
+        return stress_table(
+            self._table,
+            self._require_price_index("returns") if returns is None else None,
+            returns=returns,
+            n_paths=n_paths,
+            horizon=horizon,
+            method=method,
+            max_workers=max_workers,
+            seed=seed,
+            **kwargs,
+        )
+
+    def _node_metric(self, values):
+        if not self._table.aggregated[self._node]:
+            return None
+        return values[self._node]
+
+    @classmethod
+    def from_table(cls, table, node=0, name=None, owner=None, price_index=None, symbol_states=None):
+        # Views of one tree share its price index and running symbol state
+        # (by reference), so any node can append prices or compute risk.
+        portfolio = cls.__new__(cls)
+        portfolio.name = table.node_names[node] if name is None else name
+        portfolio.owner = table.node_owners[node] if owner is None else owner
+        portfolio.symbol_states = {} if symbol_states is None else symbol_states
+        portfolio.price_index = price_index
+        portfolio.stream_report = None
+        portfolio._tables = None
+        return portfolio._attach(table, node)
+
+    def _attach(self, table, node=0):
+        self._table, self._node, self._positions, self._tables = table, node, None, None
+        self.sub_portfolios = [
+            Portfolio.from_table(
+                table, child, price_index=self.price_index, symbol_states=self.symbol_states
+            )
+            for child in table.children[node]
+        ]
+        return self
 
     def compute_aggregate_metrics(self):
-        if not self.positions:
-            self.total_value = 0
-            self.aggregate_volatility = 0
-            self.max_drawdown = 0
-            return
+        self._table.aggregate([self._node])
+
+    def append_prices(self, symbol, prices):
+        # Updates every position in the tree holding symbol from O(1) running
+        # state, then re-aggregates only the portfolios that hold it directly.
+        state = self.symbol_states.get(symbol)
+        if state is None:
+            state = RunningMetrics()
+            if self.price_index is not None and symbol in self.price_index:
+                state.update(self.price_index.prices(symbol))
+            self.symbol_states[symbol] = state
+        if np.ndim(prices) == 0:
+            state.push(prices)
+        else:
+            state.update(prices)
 
-        total_value = sum(p.value for p in self.positions)
-        self.total_value = total_value
-        weights = np.array([p.value / total_value for p in self.positions])
-        vols = np.array([p.volatility for p in self.positions])
-        dds = np.array([p.drawdown for p in self.positions])
-        self.aggregate_volatility = np.nansum(weights * vols)
-        self.max_drawdown = np.nansum(weights * dds)
+        if self._tables is None:
+            self._tables = list({id(node._table): node._table for node in self.walk()}.values())
+        for table in self._tables:
+            rows = table.symbol_rows(symbol)
+            if len(rows) == 0:
+                continue
+            table.volatility[rows] = state.volatility
+            table.drawdown[rows] = state.drawdown
+            table.has_metrics[rows] = True
+            table.aggregate(np.unique(table.row_node[rows]))
+        return state
+
+    def walk(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.sub_portfolios))
 
     def to_dict(self):
         d = {
@@ -69,61 +298,205 @@ class Portfolio:
                 for p in self.positions
             ],
         }
+        if self.covariance_volatility is not None:
+            d["covariance_volatility"] = self.covariance_volatility
+        tail = self.tail_risk
+        if tail is not None:
+            d.update(tail)
         if self.sub_portfolios:
             d["sub_portfolios"] = [sp.to_dict() for sp in self.sub_portfolios]
         return d
 
-    def build_sequential(self, json_data, price_data, use_polars=False):
-        self.positions = [
-            create_position(pos, price_data, use_polars) for pos in json_data.get("positions", [])
-        ]
-        self.sub_portfolios = [
-            Portfolio(sub["name"]).build_sequential(sub, price_data, use_polars)
-            for sub in json_data.get("sub_portfolios", [])
-        ]
-        self.compute_aggregate_metrics()
-        return self
+    def build_sequential(self, json_data, price_data, use_polars=False, metric_cache=None, backend=None):
+        # Reference path: every position computes its own metrics, duplicates
+        # included, from its slice of the price index.
+        price_data = index_price_data(price_data, use_polars, backend)
+        with span("from_json"):
+            table = PositionTable.from_json(json_data)
+        keys = {}
+        for row in range(len(table)):
+            symbol = table.symbols[table.symbol_ids[row]]
+            if metric_cache is not None and symbol in price_data:
+                if symbol not in keys:
+                    keys[symbol] = metric_cache.key(symbol, price_data.prices(symbol), METRIC_PARAMS)
+                hit = metric_cache.get(keys[symbol])
+                if hit is not None:
+                    table.set_metrics(row, *hit)
+                    continue
+            p = Position.view(table, row, price_data.get(symbol))
+            p.compute_metrics(backend=price_data.backend)
+            if symbol in keys and p.volatility is not None:
+                metric_cache.put(keys[symbol], (p.volatility, p.drawdown))
+        with span("aggregate", rows=len(table)):
+            table.aggregate()
+        self.price_index = price_data
+        return self._attach(table)
+
+    def build_threaded(
+        self, json_data, price_data, use_polars=False, max_workers=4, metric_cache=None, backend=None
+    ):
+        # One pool for the whole tree: every unique symbol is computed once,
+        # then the nodes are assembled and aggregated bottom-up.
+        price_data = index_price_data(price_data, use_polars, backend)
 
-    def build_threaded(self, json_data, price_data, use_polars=False, max_workers=4):
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            self.positions = list(
-                executor.map(
-                    lambda pos: create_position(pos, price_data, use_polars),
-                    json_data.get("positions", []),
+        def compute(symbols):
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(
+                    lambda symbol: compute_symbol_metrics(symbol, price_data), symbols
                 )
-            )
-        self.sub_portfolios = [
-            Portfolio(sub["name"]).build_threaded(sub, price_data, use_polars, max_workers)
-            for sub in json_data.get("sub_portfolios", [])
-        ]
-        self.compute_aggregate_metrics()
-        return self
+                return dict(zip(symbols, results))
+
+        metrics = cached_metrics(collect_symbols(json_data), price_data, compute, metric_cache)
+        return self.assemble(json_data, price_data, metrics)
+
+    def build_batch(self, json_data, price_data, use_polars=False, metric_cache=None, backend=None):
+        price_data = index_price_data(price_data, use_polars, backend)
 
+        def compute(symbols):
+            symbols = [s for s in symbols if s in price_data]
+            return price_data.backend.batch_metrics(price_data, symbols)
 
-def create_position(pos, price_data, use_polars):
+        metrics = cached_metrics(collect_symbols(json_data), price_data, compute, metric_cache)
+        return self.assemble(json_data, price_data, metrics)
+
+    def build_multiprocess(
+        self, json_data, price_data, use_polars=False, max_workers=4, metric_cache=None, backend=None
+    ):
+        price_data = index_price_data(price_data, use_polars, backend)
+        metrics = cached_metrics(
+            collect_symbols(json_data),
+            price_data,
+            lambda symbols: multiprocessing_metrics(price_data, symbols, max_workers),
+            metric_cache,
+        )
+        return self.assemble(json_data, price_data, metrics)
+
+    def assemble(self, json_data, price_data, metrics):
+        with span("from_json"):
+            table = PositionTable.from_json(json_data)
+        with span("aggregate", rows=len(table)):
+            table.set_symbol_metrics(metrics)
+            table.aggregate()
+        self.price_index = price_data
+        return self._attach(table)
+
+
+def collect_symbols(json_data):
+    symbols = {}
+    stack = [json_data]
+    while stack:
+        node = stack.pop()
+        for pos in node.get("positions", []):
+            symbols.setdefault(pos["symbol"], None)
+        stack.extend(reversed(node.get("sub_portfolios", [])))
+    return list(symbols)
+
+
+def cached_metrics(symbols, price_data, compute, metric_cache=None):
+    # Looks each symbol up in metric_cache and calls compute only for the
+    # misses; symbols without price data are never cached.
+    if metric_cache is None:
+        return compute(symbols)
+    keys = {s: metric_cache.key(s, price_data.prices(s), METRIC_PARAMS) for s in symbols if s in price_data}
+    metrics, missing = {}, []
+    for symbol in symbols:
+        hit = metric_cache.get(keys[symbol]) if symbol in keys else None
+        if hit is None:
+            missing.append(symbol)
+        else:
+            metrics[symbol] = hit
+    if missing:
+        computed = compute(missing)
+        for symbol in missing:
+            value = computed.get(symbol)
+            if symbol in keys and value is not None and value[0] is not None:
+                metric_cache.put(keys[symbol], value)
+        metrics.update(computed)
+    return metrics
+
+
+def price_metrics(symbol, data, backend):
+    # (volatility, drawdown) of one symbol's price rows, or None without data.
+    if data is None or len(data) == 0:
+        return None
+    with span("pct_change", symbol, len(data)):
+        returns = backend.returns(data)
+    with span("metrics", symbol, len(returns)):
+        return compute_volatility(returns), compute_max_drawdown(returns)
+
+
+def compute_symbol_metrics(symbol, price_data, use_polars=False, backend=None):
+    # Computed straight from the index slice, without a throwaway Position.
+    index = index_price_data(price_data, use_polars, backend)
+    with span("symbol_task", symbol):
+        metrics = price_metrics(symbol, index.get(symbol), index.backend)
+    return (None, None) if metrics is None else metrics
+
+
+def create_position(pos, price_data, use_polars=False, backend=None):
     symbol = pos["symbol"]
-    if use_polars:
-        df = price_data.filter(pl.col("symbol") == symbol)
-    else:
-        df = price_data[price_data["symbol"] == symbol].copy()
-
-    if use_polars and "price" not in df.columns:
-        df = df.rename({df.columns[-1]: "price"})
-    elif not use_polars and "price" not in df.columns:
-        df.rename(columns={df.columns[-1]: "price"}, inplace=True)
-
-    p = Position(symbol, pos["quantity"], pos["price"], df)
-    p.compute_metrics(use_polars=use_polars)
+    index = index_price_data(price_data, use_polars, backend)
+    p = Position(symbol, pos["quantity"], pos["price"], index.get(symbol))
+    p.compute_metrics(backend=index.backend)
     return p
 
 
-def portfolio_from_file(json_path, csv_path, use_polars=False, threaded=False, max_workers=4):
+def portfolio_from_file(
+    json_path,
+    csv_path,
+    use_polars=False,
+    threaded=False,
+    max_workers=4,
+    batch=False,
+    executor=None,
+    start=None,
+    end=None,
+    max_memory_mb=None,
+    metric_cache=None,
+    backend=None,
+    compact=False,
+    float32=False,
+):
+    # backend is "pandas", "polars" or "numpy"; use_polars=True is the older
+    # spelling of backend="polars". compact/float32 select the memory-compact
+    # load (see load_price_data); metrics are still computed in float64.
+    if executor is None:
+        executor = "batch" if batch else "thread" if threaded else "sequential"
+    if executor not in ("sequential", "thread", "process", "batch", "stream"):
+        raise ValueError(f"Unknown executor: {executor}")
+    backend = get_backend(backend, use_polars)
+
     with open(json_path, "r") as f:
         json_data = json.load(f)
-    price_data = load_price_data(csv_path, use_polars=use_polars)
     portfolio = Portfolio(json_data["name"], json_data.get("owner"))
-    if threaded:
-        portfolio.build_threaded(json_data, price_data, use_polars, max_workers)
-    else:
-        portfolio.build_sequential(json_data, price_data, use_polars)
+    if executor == "stream":
+        if start is not None or end is not None:
+            raise ValueError("The stream executor does not support start/end filters")
+        with span("build_stream"):
+            accumulators, portfolio.stream_report = stream_metrics(
+                csv_path, collect_symbols(json_data), max_memory_mb=max_memory_mb, backend=backend
+            )
+        metrics = {symbol: (acc.volatility, acc.drawdown) for symbol, acc in accumulators.items()}
+        portfolio.symbol_states.update(accumulators)
+        return portfolio.assemble(json_data, None, metrics)
+
+    price_data = load_price_data(
+        csv_path,
+        symbols=collect_symbols(json_data),
+        start=start,
+        end=end,
+        backend=backend,
+        compact=compact,
+        float32=float32,
+    )
+    price_data = index_price_data(price_data, backend=backend)
+    with span(f"build_{executor}", rows=len(price_data.data)):
+        if executor == "batch":
+            portfolio.build_batch(json_data, price_data, metric_cache=metric_cache)
+        elif executor == "process":
+            portfolio.build_multiprocess(json_data, price_data, max_workers=max_workers, metric_cache=metric_cache)
+        elif executor == "thread":
+            portfolio.build_threaded(json_data, price_data, max_workers=max_workers, metric_cache=metric_cache)
+        else:
+            portfolio.build_sequential(json_data, price_data, metric_cache=metric_cache)
     return portfolio
@@ -0,0 +1,136 @@
+import numpy as np
+
+
+class PositionTable:
+    # Struct-of-arrays storage for every position of a portfolio tree. Nodes
+    # are numbered in pre-order and node i owns the contiguous rows
+    # node_offsets[i]:node_offsets[i + 1], so per-node aggregation is a
+    # segmented reduction over the position arrays.
+    def __init__(
+        self, symbols, quantity, price, node_offsets=None, node_names=None, node_owners=None, children=None
+    ):
+        index = {}
+        self.symbol_ids = np.array([index.setdefault(s, len(index)) for s in symbols], dtype=np.int64)
+        self.symbols = list(index)
+        self.symbol_index = index
+        self.quantity = np.asarray(quantity, dtype=float)
+        self.price = np.asarray(price, dtype=float)
+        self.value = self.quantity * self.price
+
+        n = len(self.symbol_ids)
+        self.volatility = np.full(n, np.nan)
+        self.drawdown = np.full(n, np.nan)
+        self.has_metrics = np.zeros(n, dtype=bool)
+
+        self.node_offsets = np.asarray([0, n] if node_offsets is None else node_offsets, dtype=np.int64)
+        n_nodes = len(self.node_offsets) - 1
+        self.node_names = list(node_names) if node_names is not None else [None] * n_nodes
+        self.node_owners = list(node_owners) if node_owners is not None else [None] * n_nodes
+        self.children = list(children) if children is not None else [[] for _ in range(n_nodes)]
+        self.row_node = np.repeat(np.arange(n_nodes), np.diff(self.node_offsets))
+
+        self.total_value = np.zeros(n_nodes)
+        self.aggregate_volatility = np.zeros(n_nodes)
+        self.max_drawdown = np.zeros(n_nodes)
+        self.aggregated = np.zeros(n_nodes, dtype=bool)
+        self.covariance_volatility = np.full(n_nodes, np.nan)
+        self.tail_confidence = ()
+        self.value_at_risk = np.empty((n_nodes, 0))
+        self.expected_shortfall = np.empty((n_nodes, 0))
+        self._symbol_rows = None
+
+    def __len__(self):
+        return len(self.symbol_ids)
+
+    @property
+    def n_nodes(self):
+        return len(self.node_offsets) - 1
+
+    @classmethod
+    def from_json(cls, json_data):
+        symbols, quantity, price = [], [], []
+        offsets, names, owners, children = [0], [], [], []
+        stack = [(json_data, None)]
+        while stack:
+            node, parent = stack.pop()
+            i = len(names)
+            names.append(node.get("name"))
+            owners.append(node.get("owner"))
+            children.append([])
+            if parent is not None:
+                children[parent].append(i)
+            for pos in node.get("positions", []):
+                symbols.append(pos["symbol"])
+                quantity.append(pos["quantity"])
+                price.append(pos["price"])
+            offsets.append(len(symbols))
+            stack.extend((sub, i) for sub in reversed(node.get("sub_portfolios", [])))
+        return cls(symbols, quantity, price, offsets, names, owners, children)
+
+    def node_rows(self, node):
+        return range(int(self.node_offsets[node]), int(self.node_offsets[node + 1]))
+
+    def symbol_rows(self, symbol):
+        if self._symbol_rows is None:
+            order = np.argsort(self.symbol_ids, kind="stable")
+            bounds = np.searchsorted(self.symbol_ids[order], np.arange(len(self.symbols) + 1))
+            self._symbol_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.symbols))]
+        sid = self.symbol_index.get(symbol)
+        return self._symbol_rows[sid] if sid is not None else np.array([], dtype=np.int64)
+
+    def set_metrics(self, row, volatility, drawdown):
+        computed = volatility is not None
+        self.volatility[row] = volatility if computed else np.nan
+        self.drawdown[row] = drawdown if drawdown is not None else np.nan
+        self.has_metrics[row] = computed
+
+    def set_symbol_metrics(self, metrics):
+        # metrics maps symbol -> (volatility, drawdown); symbols that are absent
+        # or map to None stay "not computed", like a Position with no data.
+        vols = np.full(len(self.symbols), np.nan)
+        dds = np.full(len(self.symbols), np.nan)
+        known = np.zeros(len(self.symbols), dtype=bool)
+        for i, symbol in enumerate(self.symbols):
+            vol, dd = metrics.get(symbol, (None, None))
+            if vol is not None:
+                vols[i], dds[i], known[i] = vol, dd, True
+        self.volatility = vols[self.symbol_ids]
+        self.drawdown = dds[self.symbol_ids]
+        self.has_metrics = known[self.symbol_ids]
+
+    def aggregate(self, nodes=None):
+        # Value-weighted volatility and drawdown per node, NaN metrics counting
+        # as zero (as np.nansum did); nodes without positions report zeros.
+        if nodes is None:
+            nodes = np.arange(self.n_nodes)
+            starts = self.node_offsets[:-1]
+            total, wvol, wdd = (
+                np.add.reduceat(np.append(x, 0.0), starts)
+                for x in self._weighted(slice(None))
+            )
+        else:
+            nodes = np.asarray(nodes, dtype=np.int64)
+            sums = [
+                [x.sum() for x in self._weighted(slice(self.node_offsets[i], self.node_offsets[i + 1]))]
+                for i in nodes
+            ]
+            total, wvol, wdd = np.array(sums, dtype=float).reshape(-1, 3).T.copy()
+        empty = self.node_offsets[nodes + 1] == self.node_offsets[nodes]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            agg_vol = wvol / total
+            agg_dd = wdd / total
+        total[empty] = agg_vol[empty] = agg_dd[empty] = 0.0
+
+        self.total_value[nodes] = total
+        self.aggregate_volatility[nodes] = agg_vol
+        self.max_drawdown[nodes] = agg_dd
+        self.aggregated[nodes] = True
+
+    def _weighted(self, rows):
+        value = self.value[rows]
+        return (
+            value,
+            np.nan_to_num(value * self.volatility[rows], nan=0.0),
+            np.nan_to_num(value * self.drawdown[rows], nan=0.0),
+        )
@@ -0,0 +1,206 @@
+import numpy as np
+from data_loader import index_price_data
+from metrics import compute_max_drawdown
+
+BOOTSTRAP_ELEMENTS = 4_000_000
+WHAT_IF_ELEMENTS = 4_000_000
+
+
+def aligned_returns(price_data, symbols=None, use_polars=False, backend=None):
+    # (time x symbol) simple returns on the union of all timestamps. Prices are
+    # carried forward over gaps, so a symbol that did not trade on a date has
+    # a zero return there (and before its first observation).
+    index = index_price_data(price_data, use_polars, backend)
+    symbols = index.symbols if symbols is None else [s for s in symbols if s in index]
+    filled, calendar = index.aligned_prices(symbols, fill="ffill")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = filled[1:] / filled[:-1] - 1
+    return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0), symbols, calendar[1:]
+
+
+def exposure_matrix(table, symbols, normalize=False):
+    # (node x symbol) position values of a PositionTable, or value weights
+    # when normalize is set; symbols not in symbols are left out.
+    symbol_index = {s: i for i, s in enumerate(symbols)}
+    exposures = np.zeros((table.n_nodes, len(symbols)))
+    columns = np.array([symbol_index.get(s, -1) for s in table.symbols], dtype=np.int64)
+    columns = columns[table.symbol_ids]
+    known = columns >= 0
+    values = table.value
+    if normalize:
+        totals = np.add.reduceat(np.append(table.value, 0.0), table.node_offsets[:-1])
+        totals[np.diff(table.node_offsets) == 0] = 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = table.value / totals[table.row_node]
+    np.add.at(exposures, (table.row_node[known], columns[known]), values[known])
+    return np.nan_to_num(exposures)
+
+
+def _tail_statistics(pnl, confidence):
+    # Historical VaR/ES per column from np.partition order statistics: VaR is
+    # the loss at the ceil((1 - c) * T)-th worst outcome and ES the mean loss
+    # of the outcomes up to and including it.
+    t = len(pnl)
+    ks = [max(int(np.ceil((1 - c) * t)) - 1, 0) for c in confidence]
+    part = np.partition(pnl, sorted(set(ks)), axis=0)
+    var = np.stack([-part[k] for k in ks], axis=-1)
+    es = np.stack([-part[:k + 1].mean(axis=0) for k in ks], axis=-1)
+    return var, es
+
+
+def tail_risk(returns, exposures, confidence=(0.95, 0.99), bootstrap=0, seed=0, chunk=None):
+    # Historical (and optionally bootstrapped) VaR and Expected Shortfall for
+    # every node at every confidence level. The (time x node) P&L matrix is one
+    # product of the aligned returns with the node exposures; bootstrap draws
+    # resample its rows chunk draws at a time (default: BOOTSTRAP_ELEMENTS
+    # values per block) and average the resulting estimates.
+    returns = np.asarray(returns, dtype=float)
+    exposures = np.atleast_2d(np.asarray(exposures, dtype=float))
+    confidence = tuple(confidence)
+    pnl = returns @ exposures.T
+    if len(pnl) == 0:
+        empty = np.full((exposures.shape[0], len(confidence)), np.nan)
+        return empty, empty.copy()
+    if not bootstrap:
+        return _tail_statistics(pnl, confidence)
+
+    if chunk is None:
+        chunk = max(1, BOOTSTRAP_ELEMENTS // max(pnl.size, 1))
+    rng = np.random.default_rng(seed)
+    var_sum = np.zeros((pnl.shape[1], len(confidence)))
+    es_sum = np.zeros_like(var_sum)
+    for start in range(0, bootstrap, chunk):
+        draws = min(chunk, bootstrap - start)
+        samples = pnl[rng.integers(0, len(pnl), size=(len(pnl), draws))]
+        var, es = _tail_statistics(samples, confidence)
+        var_sum += var.sum(axis=0)
+        es_sum += es.sum(axis=0)
+    return var_sum / bootstrap, es_sum / bootstrap
+
+
+class CovarianceEngine:
+    # Sample covariance of a (time x symbol) return matrix, kept as a count,
+    # mean vector and co-moment matrix so new return rows can be merged in
+    # with a rank-k update instead of recomputing from the full history.
+    def __init__(self, returns, symbols):
+        returns = np.asarray(returns, dtype=float)
+        self.symbols = list(symbols)
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self.count = len(returns)
+        self.mean = returns.mean(axis=0) if self.count else np.zeros(len(self.symbols))
+        centered = returns - self.mean
+        self.comoment = centered.T @ centered
+        self._covariance = None
+
+    @classmethod
+    def from_price_data(cls, price_data, symbols=None, use_polars=False):
+        returns, symbols, _ = aligned_returns(price_data, symbols, use_polars)
+        return cls(returns, symbols)
+
+    @property
+    def covariance(self):
+        if self._covariance is None:
+            if self.count < 2:
+                self._covariance = np.full_like(self.comoment, np.nan)
+            else:
+                self._covariance = self.comoment / (self.count - 1)
+        return self._covariance
+
+    def update(self, returns):
+        # Merges one return row (rank-one) or a block of rows into the running
+        # moments (Chan et al. pairwise update).
+        returns = np.atleast_2d(np.asarray(returns, dtype=float))
+        n = len(returns)
+        if n == 0:
+            return self
+        mean = returns.mean(axis=0)
+        centered = returns - mean
+        total = self.count + n
+        delta = mean - self.mean
+        self.comoment += centered.T @ centered + np.outer(delta, delta) * (self.count * n / total)
+        self.mean = self.mean + delta * (n / total)
+        self.count = total
+        self._covariance = None
+        return self
+
+    def weight_matrix(self, table):
+        # (node x symbol) value weights of a PositionTable; symbols the engine
+        # does not know are left out of the node's risk.
+        return exposure_matrix(table, self.symbols, normalize=True)
+
+    def portfolio_volatility(self, weights):
+        # sqrt(w^T Sigma w) for every row of a stacked weight matrix, as one
+        # matrix product.
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        variance = np.einsum("ij,ij->i", weights @ self.covariance, weights)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    def node_volatility(self, table):
+        return self.portfolio_volatility(self.weight_matrix(table))
+
+
+class WhatIfEvaluator:
+    # Scores candidate quantity vectors for one node's positions against a
+    # fixed history. The (time x position) return matrix and its covariance
+    # are built once; every candidate is then a row of a (candidate x
+    # position) matrix and all metrics are matrix products over it.
+    def __init__(self, symbols, price, volatility, drawdown, returns, return_symbols):
+        self.symbols = list(symbols)
+        self.price = np.asarray(price, dtype=float)
+        self.volatility = np.nan_to_num(np.asarray(volatility, dtype=float))
+        self.drawdown = np.nan_to_num(np.asarray(drawdown, dtype=float))
+        # Positions without price history contribute value but no return.
+        returns = np.asarray(returns, dtype=float)
+        columns = {s: i for i, s in enumerate(return_symbols)}
+        self.returns = np.zeros((len(returns), len(self.symbols)))
+        for j, symbol in enumerate(self.symbols):
+            if symbol in columns:
+                self.returns[:, j] = returns[:, columns[symbol]]
+        self.engine = CovarianceEngine(self.returns, self.symbols)
+
+    @classmethod
+    def from_table(cls, table, node, returns, return_symbols):
+        rows = table.node_rows(node)
+        return cls(
+            [table.symbols[i] for i in table.symbol_ids[rows]],
+            table.price[rows],
+            table.volatility[rows],
+            table.drawdown[rows],
+            returns,
+            return_symbols,
+        )
+
+    def evaluate(self, quantities, chunk=None):
+        # quantities is (candidates x positions). Returns per-candidate arrays:
+        #   total_value, aggregate_volatility, max_drawdown  as Portfolio
+        #     reports them (value-weighted position metrics)
+        #   covariance_volatility  sqrt(w^T Sigma w) of the rebalanced node
+        #   historical_drawdown  max drawdown of its value-weighted returns
+        # The drawdown needs the full (time x candidate) return path, so it is
+        # computed chunk candidates at a time (default: WHAT_IF_ELEMENTS
+        # values per block).
+        quantities = np.atleast_2d(np.asarray(quantities, dtype=float))
+        if quantities.shape[1] != len(self.symbols):
+            raise ValueError(f"Expected {len(self.symbols)} quantities per candidate, got {quantities.shape[1]}")
+        values = quantities * self.price
+        total = values.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = values / total[:, None]
+            agg_vol = values @ self.volatility / total
+            agg_dd = values @ self.drawdown / total
+        weights = np.nan_to_num(weights)
+
+        if chunk is None:
+            chunk = max(1, WHAT_IF_ELEMENTS // max(len(self.returns), 1))
+        drawdown = np.full(len(quantities), np.nan)
+        if len(self.returns):
+            for start in range(0, len(quantities), chunk):
+                paths = self.returns @ weights[start:start + chunk].T
+                drawdown[start:start + chunk] = compute_max_drawdown(paths, axis=0)
+        return {
+            "total_value": total,
+            "aggregate_volatility": agg_vol,
+            "max_drawdown": agg_dd,
+            "covariance_volatility": self.engine.portfolio_volatility(weights),
+            "historical_drawdown": drawdown,
+        }
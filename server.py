@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+import numpy as np
+from data_loader import load_price_data, index_price_data
+from portfolio import Portfolio, collect_symbols
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+class SymbolBatcher:
+    # Coalesces the symbols asked for by concurrent portfolio requests. The
+    # first miss opens a short window; every symbol requested during it is
+    # computed in one batch_metrics call off the event loop. Prices never
+    # change while the server runs, so each symbol is computed at most once and
+    # later requests share the finished result.
+    def __init__(self, index, window=0.002):
+        self.index = index
+        self.window = window
+        self.batches = 0
+        self.computed = 0
+        self.requested = 0
+        self.shared = 0
+        self._futures = {}
+        self._queue = []
+        self._flush_task = None
+
+    async def metrics(self, symbols):
+        loop = asyncio.get_running_loop()
+        waits = {}
+        for symbol in symbols:
+            future = self._futures.get(symbol)
+            if future is None:
+                future = self._futures[symbol] = loop.create_future()
+                self._queue.append(symbol)
+            else:
+                self.shared += 1
+            waits[symbol] = future
+        self.requested += len(waits)
+        if self._queue and self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush())
+        # shield: a cancelled request must not cancel futures other requests share
+        results = await asyncio.gather(*(asyncio.shield(f) for f in waits.values()))
+        return dict(zip(waits, results))
+
+    async def _flush(self):
+        await asyncio.sleep(self.window)
+        symbols, self._queue, self._flush_task = self._queue, [], None
+        known = [s for s in symbols if s in self.index]
+        try:
+            metrics = await asyncio.get_running_loop().run_in_executor(
+                None, self.index.backend.batch_metrics, self.index, known
+            )
+        except Exception as exc:
+            for symbol in symbols:
+                self._futures.pop(symbol).set_exception(exc)
+            return
+        self.batches += 1
+        self.computed += len(known)
+        for symbol in symbols:
+            self._futures[symbol].set_result(metrics.get(symbol, (None, None)))
+
+
+class RiskServer:
+    # Long-running service that loads and indexes the price file once and
+    # answers portfolio requests (portfolio_structure JSON in, Portfolio.to_dict
+    # out) over localhost HTTP or a Unix socket.
+    #   POST /portfolio  evaluate a portfolio tree
+    #   GET  /stats      request latency percentiles and batching counters
+    #   GET  /health     liveness
+    def __init__(self, csv_path, backend=None, batch_window=0.002, max_latencies=10_000):
+        self.csv_path = csv_path
+        self.backend = backend
+        self.batch_window = batch_window
+        self.index = None
+        self.batcher = None
+        self.latencies = deque(maxlen=max_latencies)
+        self.requests = 0
+        self.errors = 0
+        self.started = None
+
+    def load(self):
+        self.index = index_price_data(load_price_data(self.csv_path, backend=self.backend), backend=self.backend)
+        self.batcher = SymbolBatcher(self.index, self.batch_window)
+        return self
+
+    async def evaluate(self, json_data):
+        symbols = collect_symbols(json_data)
+        metrics = await self.batcher.metrics(symbols)
+
+        def build():
+            portfolio = Portfolio(json_data["name"], json_data.get("owner"))
+            return portfolio.assemble(json_data, self.index, metrics).to_dict()
+
+        return await asyncio.get_running_loop().run_in_executor(None, build)
+
+    def stats(self):
+        latencies = np.array(self.latencies, dtype=float) * 1000
+        summary = {"count": len(latencies)}
+        if len(latencies):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            summary.update(
+                mean_ms=float(latencies.mean()),
+                p50_ms=float(p50),
+                p90_ms=float(p90),
+                p99_ms=float(p99),
+                max_ms=float(latencies.max()),
+            )
+        batcher = self.batcher
+        return {
+            "uptime_sec": time.monotonic() - self.started if self.started is not None else 0.0,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": summary,
+            "batching": {
+                "batches": batcher.batches,
+                "symbols_computed": batcher.computed,
+                "symbols_requested": batcher.requested,
+                "symbols_shared": batcher.shared,
+            },
+            "prices": {"rows": len(self.index.price_values), "symbols": len(self.index)},
+        }
+
+    async def dispatch(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method == "POST" and path == "/portfolio":
+            self.requests += 1
+            start = time.perf_counter()
+            try:
+                json_data = json.loads(body)
+                if not isinstance(json_data, dict) or "name" not in json_data:
+                    raise ValueError("expected a portfolio object with a name")
+                _validate_portfolio(json_data)
+            except ValueError as exc:
+                self.errors += 1
+                return 400, {"error": str(exc)}
+            try:
+                result = await self.evaluate(json_data)
+            except Exception as exc:
+                self.errors += 1
+                return 500, {"error": repr(exc)}
+            self.latencies.append(time.perf_counter() - start)
+            return 200, result
+        return 404, {"error": f"no route for {method} {path}"}
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: one JSON response per request.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = await _read_headers(reader)
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, path, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        if self.index is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.load)
+        self.started = time.monotonic()
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle, path=unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def _validate_portfolio(node, path="portfolio"):
+    # Malformed input is the client's error (400), not a server fault (500).
+    if not isinstance(node, dict):
+        raise ValueError(f"{path}: expected an object")
+    positions = node.get("positions", [])
+    if not isinstance(positions, list):
+        raise ValueError(f"{path}.positions: expected a list")
+    for i, pos in enumerate(positions):
+        if not isinstance(pos, dict) or not isinstance(pos.get("symbol"), str):
+            raise ValueError(f"{path}.positions[{i}]: expected an object with a string symbol")
+        for field in ("quantity", "price"):
+            value = pos.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{path}.positions[{i}].{field}: expected a number")
+    subs = node.get("sub_portfolios", [])
+    if not isinstance(subs, list):
+        raise ValueError(f"{path}.sub_portfolios: expected a list")
+    for i, sub in enumerate(subs):
+        _validate_portfolio(sub, f"{path}.sub_portfolios[{i}]")
+
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def fetch(method, path, payload=None, host="127.0.0.1", port=8765, unix_path=None):
+    # One request/response round trip against a RiskServer; returns
+    # (status, decoded JSON body).
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = await _read_headers(reader)
+    data = await reader.readexactly(int(headers.get("content-length", 0)))
+    writer.close()
+    await writer.wait_closed()
+    return int(status_line.split()[1]), json.loads(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve portfolio risk from price data held in memory.")
+    parser.add_argument("--csv", default="market_data-1.csv")
+    parser.add_argument("--backend", default="pandas", choices=["pandas", "polars", "numpy"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--batch-window-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    async def serve():
+        server = RiskServer(args.csv, args.backend, args.batch_window_ms / 1000)
+        listener = await server.start(args.host, args.port, args.unix)
+        where = args.unix or f"http://{args.host}:{args.port}"
+        print(f"Serving {len(server.index)} symbols from {args.csv} on {where}")
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import resource
+import sys
+import numpy as np
+from backends import get_backend
+from metrics import RunningMetrics
+
+DEFAULT_BATCH_ROWS = 500_000
+
+
+class StreamReport:
+    def __init__(self, rows, batches, batch_rows, peak_rss_mb):
+        self.rows = rows
+        self.batches = batches
+        self.batch_rows = batch_rows
+        self.peak_rss_mb = peak_rss_mb
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "batches": self.batches,
+            "batch_rows": self.batch_rows,
+            "peak_rss_mb": round(self.peak_rss_mb, 2),
+        }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 ** 2) if sys.platform == "darwin" else peak / 1024
+
+
+def batch_rows_for_budget(filename, max_memory_mb, sample_rows=10_000, backend=None):
+    # Sizes batches from the in-memory footprint of a sample read through the
+    # streaming backend, leaving headroom for the sort/return temporaries
+    # built from each batch.
+    batches = get_backend(backend).iter_csv_batches(filename, sample_rows)
+    sample = next(batches, None)
+    batches.close()
+    if sample is None or len(sample[1]) == 0:
+        return DEFAULT_BATCH_ROWS
+    size = 0
+    for values in sample:
+        size += values.nbytes
+        if values.dtype == object:
+            size += sum(sys.getsizeof(v) for v in values)
+    return max(1_000, int(max_memory_mb * 1024 ** 2 / (4 * size / len(sample[1]))))
+
+
+def stream_metrics(filename, symbols=None, batch_rows=None, max_memory_mb=None, use_polars=False, backend=None):
+    backend = get_backend(backend, use_polars)
+    if batch_rows is None and max_memory_mb is not None:
+        batch_rows = batch_rows_for_budget(filename, max_memory_mb, backend=backend)
+    elif batch_rows is None:
+        batch_rows = DEFAULT_BATCH_ROWS
+    symbols = None if symbols is None else set(symbols)
+
+    accumulators = {}
+    rows = batches = 0
+    for batch_symbols, prices in backend.iter_csv_batches(filename, batch_rows, symbols):
+        rows += len(prices)
+        batches += 1
+        codes, uniques = backend.factorize(batch_symbols)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for i, symbol in enumerate(uniques):
+            acc = accumulators.setdefault(symbol, RunningMetrics())
+            acc.update(prices[order[bounds[i]:bounds[i + 1]]])
+
+    return accumulators, StreamReport(rows, batches, batch_rows, peak_rss_mb())
@@ -0,0 +1,224 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from metrics import compute_max_drawdown
+from risk import CovarianceEngine, aligned_returns, exposure_matrix
+
+STRESS_METHODS = ("bootstrap", "block", "gaussian")
+BLOCK_ELEMENTS = 4_000_000
+HISTOGRAM_BINS = 2000
+LOG_WEALTH_RANGE = (-5.0, 5.0)
+
+
+class StreamingHistogram:
+    # Fixed-bin histogram plus exact count, mean, std, min and max of a value
+    # per node. Partial histograms from separate path blocks merge by
+    # addition, so any number of paths reduces in constant memory. With log
+    # set the bins are spaced in log(value), for wealth-like quantities.
+    def __init__(self, n_nodes, low, high, bins=HISTOGRAM_BINS, log=False):
+        self.low, self.high, self.bins, self.log = low, high, bins, log
+        self.counts = np.zeros((n_nodes, bins), dtype=np.int64)
+        self.count = 0
+        self.total = np.zeros(n_nodes)
+        self.total_sq = np.zeros(n_nodes)
+        self.minimum = np.full(n_nodes, np.inf)
+        self.maximum = np.full(n_nodes, -np.inf)
+
+    @property
+    def n_nodes(self):
+        return self.counts.shape[0]
+
+    def add(self, values):
+        # values is (paths x node)
+        values = np.asarray(values, dtype=float)
+        self.count += len(values)
+        self.total += values.sum(axis=0)
+        self.total_sq += (values * values).sum(axis=0)
+        self.minimum = np.minimum(self.minimum, values.min(axis=0, initial=np.inf))
+        self.maximum = np.maximum(self.maximum, values.max(axis=0, initial=-np.inf))
+
+        scaled = np.log(np.maximum(values, 1e-300)) if self.log else values
+        width = (self.high - self.low) / self.bins
+        bins = np.clip((scaled - self.low) / width, 0, self.bins - 1).astype(np.int64)
+        bins += np.arange(self.n_nodes) * self.bins
+        self.counts += np.bincount(bins.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.full(self.n_nodes, np.nan)
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return np.full(self.n_nodes, np.nan)
+        variance = (self.total_sq - self.total * self.mean) / (self.count - 1)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    def quantile(self, q):
+        # Per-node quantile, interpolated linearly inside the bin that holds
+        # it; accurate to one bin width and clipped to the exact extremes.
+        if not self.count:
+            return np.full(self.n_nodes, np.nan)
+        target = q * self.count
+        cumulative = np.cumsum(self.counts, axis=1)
+        idx = np.minimum((cumulative < target).sum(axis=1), self.bins - 1)
+        nodes = np.arange(self.n_nodes)
+        before = cumulative[nodes, idx] - self.counts[nodes, idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.nan_to_num((target - before) / self.counts[nodes, idx])
+        width = (self.high - self.low) / self.bins
+        value = self.low + (idx + np.clip(fraction, 0, 1)) * width
+        if self.log:
+            value = np.exp(value)
+        return np.clip(value, self.minimum, self.maximum)
+
+
+class StressResult:
+    # Drawdown and terminal-wealth distributions for every node of a
+    # PositionTable; terminal values are wealth multiples of the node's
+    # current total value.
+    def __init__(self, drawdown, terminal_wealth, node_names, total_value):
+        self.drawdown = drawdown
+        self.terminal_wealth = terminal_wealth
+        self.node_names = list(node_names)
+        self.total_value = np.asarray(total_value, dtype=float)
+
+    @property
+    def n_paths(self):
+        return self.drawdown.count
+
+    def summary(self, quantiles=(0.01, 0.05, 0.5)):
+        dd_q = {q: self.drawdown.quantile(q) for q in quantiles}
+        tv_q = {q: self.terminal_wealth.quantile(q) * self.total_value for q in quantiles}
+        dd_mean, tv_mean = self.drawdown.mean, self.terminal_wealth.mean * self.total_value
+        return [
+            {
+                "name": name,
+                "drawdown": {"mean": float(dd_mean[i]), **{f"q{q:g}": float(dd_q[q][i]) for q in quantiles}},
+                "terminal_value": {"mean": float(tv_mean[i]), **{f"q{q:g}": float(tv_q[q][i]) for q in quantiles}},
+            }
+            for i, name in enumerate(self.node_names)
+        ]
+
+
+def simulate_node_returns(rng, node_returns, n_paths, horizon, method="bootstrap", block_size=10, mean=None, factor=None):
+    # (paths x horizon x node) one-period node returns. Every node return is a
+    # fixed linear combination of the symbol returns, so resampled history
+    # and Gaussian draws are generated directly in node space.
+    t = len(node_returns)
+    if method == "bootstrap":
+        return node_returns[rng.integers(0, t, size=(n_paths, horizon))]
+    if method == "block":
+        # circular moving-block bootstrap, keeping short-range autocorrelation
+        n_blocks = -(-horizon // block_size)
+        starts = rng.integers(0, t, size=(n_paths, n_blocks, 1))
+        rows = ((starts + np.arange(block_size)) % t).reshape(n_paths, -1)[:, :horizon]
+        return node_returns[rows]
+    if method == "gaussian":
+        draws = rng.standard_normal((n_paths, horizon, factor.shape[1])) @ factor.T + mean
+        return np.maximum(draws, -1.0)
+    raise ValueError(f"Unknown stress method {method!r}; expected one of {STRESS_METHODS}")
+
+
+def simulate_block(seed, n_paths, horizon, method, block_size, node_returns, mean, factor, bins):
+    rng = np.random.default_rng(seed)
+    paths = simulate_node_returns(rng, node_returns, n_paths, horizon, method, block_size, mean, factor)
+    n_nodes = node_returns.shape[1]
+    drawdown = StreamingHistogram(n_nodes, -1.0, 0.0, bins).add(compute_max_drawdown(paths, axis=1))
+    wealth = StreamingHistogram(n_nodes, *LOG_WEALTH_RANGE, bins, log=True).add(np.prod(1 + paths, axis=1))
+    return drawdown, wealth
+
+
+_WORKER_INPUTS = None
+
+
+def _init_worker(node_returns, mean, factor):
+    # The history and Gaussian factor are sent once per worker process rather
+    # than pickled into every block task.
+    global _WORKER_INPUTS
+    _WORKER_INPUTS = (node_returns, mean, factor)
+
+
+def _worker_block(seed, n_paths, horizon, method, block_size, bins):
+    return simulate_block(seed, n_paths, horizon, method, block_size, *_WORKER_INPUTS, bins)
+
+
+def run_stress(
+    node_returns,
+    n_paths=10_000,
+    horizon=20,
+    method="bootstrap",
+    block_size=10,
+    seed=0,
+    max_workers=4,
+    block_paths=None,
+    bins=HISTOGRAM_BINS,
+):
+    # Simulates n_paths paths of horizon periods in blocks of block_paths,
+    # each block drawing from its own SeedSequence child so results depend on
+    # the seed and block size but not on the number of workers. Blocks are
+    # reduced into running histograms as they finish, with at most two per
+    # worker in flight.
+    if method not in STRESS_METHODS:
+        raise ValueError(f"Unknown stress method {method!r}; expected one of {STRESS_METHODS}")
+    node_returns = np.ascontiguousarray(node_returns, dtype=float)
+    n_nodes = node_returns.shape[1]
+    mean = factor = None
+    if method == "gaussian":
+        engine = CovarianceEngine(node_returns, range(n_nodes))
+        values, vectors = np.linalg.eigh(np.nan_to_num(engine.covariance))
+        mean, factor = engine.mean, vectors * np.sqrt(np.maximum(values, 0.0))
+    if block_paths is None:
+        block_paths = max(1, BLOCK_ELEMENTS // (horizon * max(n_nodes, 1)))
+
+    sizes = [min(block_paths, n_paths - start) for start in range(0, n_paths, block_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    drawdown = StreamingHistogram(n_nodes, -1.0, 0.0, bins)
+    wealth = StreamingHistogram(n_nodes, *LOG_WEALTH_RANGE, bins, log=True)
+
+    if max_workers == 1:
+        for block_seed, size in zip(seeds, sizes):
+            dd, tw = simulate_block(block_seed, size, horizon, method, block_size, node_returns, mean, factor, bins)
+            drawdown.merge(dd)
+            wealth.merge(tw)
+        return drawdown, wealth
+
+    tasks = iter(zip(seeds, sizes))
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(node_returns, mean, factor)
+    ) as executor:
+        pending = set()
+        while True:
+            for block_seed, size in tasks:
+                pending.add(executor.submit(_worker_block, block_seed, size, horizon, method, block_size, bins))
+                if len(pending) >= 2 * max_workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dd, tw = future.result()
+                drawdown.merge(dd)
+                wealth.merge(tw)
+    return drawdown, wealth
+
+
+def stress_table(table, price_data, returns=None, **kwargs):
+    # Stress every node of an aggregated PositionTable; returns is an optional
+    # (returns, symbols) pair from aligned_returns.
+    if returns is None:
+        returns, symbols, _ = aligned_returns(price_data, table.symbols)
+    else:
+        returns, symbols = returns
+    node_returns = returns @ exposure_matrix(table, symbols, normalize=True).T
+    drawdown, wealth = run_stress(node_returns, **kwargs)
+    return StressResult(drawdown, wealth, table.node_names, table.total_value)
@@ -0,0 +1,149 @@
+import argparse
+import json
+import numpy as np
+
+
+def symbol_names(n_symbols, include=None):
+    include = list(include or [])
+    generated = [f"S{i:05d}" for i in range(max(n_symbols - len(include), 0))]
+    return include + generated
+
+
+def generate_market_data(
+    n_symbols,
+    n_bars,
+    seed=0,
+    ragged=False,
+    missing_frac=0.0,
+    start="2020-01-01",
+    include=None,
+    volatility=0.02,
+):
+    # Long-format (timestamp, symbol, price) bars from independent geometric
+    # random walks. ragged drops a random listing/delisting span and random
+    # days per symbol; missing_frac blanks that share of the remaining prices.
+    import pandas as pd
+    import polars as pl
+
+    rng = np.random.default_rng(seed)
+    symbols = symbol_names(n_symbols, include)
+    dates = pd.bdate_range(start, periods=n_bars).strftime("%Y-%m-%d").to_numpy()
+
+    vols = volatility * rng.uniform(0.5, 1.5, len(symbols))
+    drifts = rng.normal(0.0003, 0.0003, len(symbols))
+    shocks = rng.standard_normal((n_bars, len(symbols))) * vols + drifts
+    prices = rng.uniform(20, 500, len(symbols)) * np.exp(np.cumsum(shocks, axis=0))
+
+    present = np.ones_like(prices, dtype=bool)
+    if ragged and n_bars > 1:
+        listed = rng.integers(0, n_bars // 4 + 1, len(symbols))
+        delisted = n_bars - rng.integers(0, n_bars // 4 + 1, len(symbols))
+        rows = np.arange(n_bars)[:, None]
+        present &= (rows >= listed) & (rows < delisted)
+        present &= rng.random(prices.shape) >= 0.02
+    if missing_frac > 0:
+        prices[rng.random(prices.shape) < missing_frac] = np.nan
+
+    rows, cols = np.nonzero(present)
+    return pl.DataFrame(
+        {
+            "timestamp": dates[rows],
+            "symbol": np.asarray(symbols)[cols],
+            "price": prices[rows, cols],
+        }
+    )
+
+
+def write_market_data(path, n_symbols, n_bars, **kwargs):
+    df = generate_market_data(n_symbols, n_bars, **kwargs)
+    df.write_csv(path)
+    return df
+
+
+def generate_portfolio_tree(
+    symbols, depth=2, fan_out=2, positions_per_node=3, seed=0, name="Synthetic Portfolio", owner="synthetic"
+):
+    # Nested portfolio JSON in the portfolio_structure format: every node
+    # holds positions_per_node positions and, above the leaves, fan_out
+    # sub-portfolios.
+    rng = np.random.default_rng(seed)
+    symbols = list(symbols)
+    counter = [0]
+
+    def build(node_name, level):
+        picks = rng.choice(len(symbols), size=min(positions_per_node, len(symbols)), replace=False)
+        node = {
+            "name": node_name,
+            "positions": [
+                {
+                    "symbol": symbols[i],
+                    "quantity": int(rng.integers(1, 1000)),
+                    "price": round(float(rng.uniform(20, 500)), 2),
+                }
+                for i in picks
+            ],
+        }
+        if level < depth:
+            subs = []
+            for _ in range(fan_out):
+                counter[0] += 1
+                subs.append(build(f"{name} / node-{counter[0]}", level + 1))
+            node["sub_portfolios"] = subs
+        return node
+
+    tree = build(name, 0)
+    tree["owner"] = owner
+    return tree
+
+
+def write_portfolio_tree(path, symbols, **kwargs):
+    tree = generate_portfolio_tree(symbols, **kwargs)
+    with open(path, "w") as f:
+        json.dump(tree, f, indent=2)
+    return tree
+
+
+def count_positions(tree):
+    return len(tree.get("positions", [])) + sum(count_positions(s) for s in tree.get("sub_portfolios", []))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic market data and portfolio trees.")
+    parser.add_argument("--csv", default="market_data-1.csv")
+    parser.add_argument("--json", default=None)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=252)
+    parser.add_argument("--include", default="AAPL,MSFT,SPY")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ragged", action="store_true")
+    parser.add_argument("--missing-frac", type=float, default=0.0)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fan-out", type=int, default=2)
+    parser.add_argument("--positions-per-node", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    include = [s for s in args.include.split(",") if s]
+    df = write_market_data(
+        args.csv,
+        args.symbols,
+        args.bars,
+        seed=args.seed,
+        ragged=args.ragged,
+        missing_frac=args.missing_frac,
+        include=include,
+    )
+    print(f"Wrote {len(df)} rows for {args.symbols} symbols to {args.csv}")
+    if args.json:
+        tree = write_portfolio_tree(
+            args.json,
+            symbol_names(args.symbols, include),
+            depth=args.depth,
+            fan_out=args.fan_out,
+            positions_per_node=args.positions_per_node,
+            seed=args.seed,
+        )
+        print(f"Wrote {count_positions(tree)} positions to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+from backends import get_backend
+from data_loader import load_price_data
+from portfolio import portfolio_from_file
+
+
+def _values(d):
+    values = [d["total_value"], d["aggregate_volatility"], d["max_drawdown"]]
+    for pos in d["positions"]:
+        values += [pos["value"], pos["volatility"], pos["drawdown"]]
+    for sub in d.get("sub_portfolios", []):
+        values += list(_values(sub))
+    return np.array(values, dtype=float)
+
+
+def test_backends_agree():
+    json_path, csv_path = "portfolio_structure-1.json", "market_data-1.csv"
+    expected = _values(portfolio_from_file(json_path, csv_path).to_dict())
+    for backend in ("pandas", "polars", "numpy"):
+        for executor in ("sequential", "thread", "batch", "stream"):
+            p = portfolio_from_file(json_path, csv_path, executor=executor, backend=backend)
+            assert np.allclose(_values(p.to_dict()), expected, atol=1e-10, equal_nan=True)
+
+
+def test_numpy_backend_loads_without_dataframes():
+    # start falls mid-history, whichever price file is present
+    timestamps = sorted(load_price_data("market_data-1.csv", symbols=["MSFT"])["timestamp"])
+    start = timestamps[len(timestamps) // 2]
+    for cache in (True, False):
+        data = load_price_data("market_data-1.csv", cache=cache, symbols=["MSFT"], start=start, backend="numpy")
+        expected = load_price_data("market_data-1.csv", cache=cache, symbols=["MSFT"], start=start)
+        assert len(data) == len(expected) > 0
+        assert np.allclose(data["price"], expected["price"].to_numpy())
+        assert set(data["symbol"]) == {"MSFT"}
+
+
+def test_use_polars_maps_to_backend():
+    assert get_backend(use_polars=True) is get_backend("polars")
+    assert get_backend() is get_backend("pandas")
+    with pytest.raises(ValueError):
+        get_backend("spark")
+
+
+def test_worker_modules_import_lazily():
+    code = "import sys, parallel, portfolio, reporting, synthetic; print(sorted({'pandas', 'polars', 'matplotlib'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
+
+
+def test_backend_returns_drop_missing_prices():
+    import pandas as pd
+
+    frame = pd.DataFrame({"symbol": ["A"] * 5, "price": [10.0, 11.0, np.nan, 12.1, 13.31]})
+    expected = get_backend("numpy").returns({"price": frame["price"].to_numpy()})
+    assert np.allclose(expected, [0.1, 0.1])
+    for backend in ("pandas", "polars"):
+        data = frame if backend == "pandas" else get_backend("polars").pl.from_pandas(frame)
+        assert np.allclose(get_backend(backend).returns(data), expected)
+
+
+def test_backend_rolling_metrics_agree():
+    import pandas as pd
+    import polars as pl
+
+    rng = np.random.default_rng(9)
+    values = rng.normal(0.001, 0.02, 80)
+    values[[10, 11]] = np.nan
+    inputs = {"numpy": values, "pandas": pd.Series(values), "polars": pl.Series(values, nan_to_null=True)}
+    expected = None
+    for backend, series in inputs.items():
+        backend = get_backend(backend)
+        result = [
+            np.asarray(method(series, 20), dtype=float)
+            for method in (backend.rolling_mean, backend.rolling_std, backend.rolling_sharpe)
+        ]
+        if expected is None:
+            expected = result
+        for got, want in zip(result, expected):
+            assert np.allclose(got, want, atol=1e-12, equal_nan=True)
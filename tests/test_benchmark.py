@@ -0,0 +1,22 @@
+import json
+from benchmark import BenchmarkStats, run_benchmark, save_results, compare_to_baseline
+
+
+def test_run_benchmark_repeats_and_tracks_memory():
+    calls = []
+    result, stats = run_benchmark(lambda: calls.append(1) or len(calls), name="append", warmup=2, repeat=5)
+    assert result == 7
+    assert len(calls) == 8
+    assert len(stats.durations) == 5
+    assert stats.p95 >= stats.median
+    assert stats.peak_alloc_mb is not None
+
+
+def test_compare_to_baseline_flags_regressions(tmp_path):
+    baseline_path = tmp_path / "baseline.json"
+    save_results([BenchmarkStats("fast", [1.0, 1.0], [1.0, 1.0], None)], baseline_path)
+    assert "environment" in json.loads(baseline_path.read_text())
+
+    assert compare_to_baseline([BenchmarkStats("fast", [1.05], [1.0], None)], baseline_path, 0.10) == []
+    regressions = compare_to_baseline([BenchmarkStats("fast", [1.5], [1.0], None)], baseline_path, 0.10)
+    assert [r["name"] for r in regressions] == ["fast"]
@@ -0,0 +1,49 @@
+import numpy as np
+from data_loader import load_price_data
+from portfolio import portfolio_from_file
+
+json_path = "portfolio_structure-1.json"
+csv_path = "market_data-1.csv"
+
+
+def test_append_prices_matches_full_rebuild():
+    prices = load_price_data(csv_path)
+    timestamps = sorted(prices["timestamp"].unique())
+    cutoff = timestamps[len(timestamps) // 2]
+
+    full = portfolio_from_file(json_path, csv_path)
+    partial = portfolio_from_file(json_path, csv_path, end=cutoff)
+
+    later = prices[prices["timestamp"] > cutoff]
+    for symbol in ["AAPL", "MSFT", "SPY"]:
+        new_prices = later.loc[later["symbol"] == symbol, "price"].to_numpy()
+        partial.append_prices(symbol, new_prices[:5])
+        for price in new_prices[5:]:
+            partial.append_prices(symbol, price)
+
+    full_dict, partial_dict = full.to_dict(), partial.to_dict()
+    assert np.isclose(full_dict["aggregate_volatility"], partial_dict["aggregate_volatility"], atol=1e-10)
+    assert np.isclose(full_dict["max_drawdown"], partial_dict["max_drawdown"], atol=1e-10)
+    sub_full, sub_partial = full_dict["sub_portfolios"][0], partial_dict["sub_portfolios"][0]
+    assert np.isclose(sub_full["aggregate_volatility"], sub_partial["aggregate_volatility"], atol=1e-10)
+    assert np.isclose(sub_full["max_drawdown"], sub_partial["max_drawdown"], atol=1e-10)
+
+
+def test_append_prices_through_sub_portfolio():
+    prices = load_price_data(csv_path)
+    timestamps = sorted(prices["timestamp"].unique())
+    cutoff = timestamps[len(timestamps) // 2]
+
+    full = portfolio_from_file(json_path, csv_path)
+    partial = portfolio_from_file(json_path, csv_path, end=cutoff)
+    sub = partial.sub_portfolios[0]
+    assert sub.price_index is partial.price_index
+
+    later = prices[prices["timestamp"] > cutoff]
+    sub.append_prices("SPY", later.loc[later["symbol"] == "SPY", "price"].to_numpy())
+    assert partial.symbol_states["SPY"] is sub.symbol_states["SPY"]
+
+    sub_full, sub_partial = full.to_dict()["sub_portfolios"][0], partial.to_dict()["sub_portfolios"][0]
+    assert np.isclose(sub_full["aggregate_volatility"], sub_partial["aggregate_volatility"], atol=1e-10)
+    assert np.isclose(sub_full["max_drawdown"], sub_partial["max_drawdown"], atol=1e-10)
+    assert np.isclose(sub.aggregate_volatility, sub_full["aggregate_volatility"], atol=1e-10)
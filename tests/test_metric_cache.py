@@ -0,0 +1,60 @@
+import numpy as np
+from metric_cache import MetricCache
+from portfolio import portfolio_from_file
+
+json_path = "portfolio_structure-1.json"
+csv_path = "market_data-1.csv"
+
+
+def test_lru_eviction_and_counters():
+    cache = MetricCache(max_entries=2)
+    keys = [MetricCache.key(s, np.arange(5.0) + i) for i, s in enumerate("ABC")]
+    for key in keys:
+        cache.put(key, (0.1, -0.2))
+    assert len(cache) == 2
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == (0.1, -0.2)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_shared_across_builders_and_persisted(tmp_path):
+    cache = MetricCache()
+    expected = portfolio_from_file(json_path, csv_path).to_dict()
+
+    first = portfolio_from_file(json_path, csv_path, executor="thread", metric_cache=cache).to_dict()
+    assert cache.stats()["misses"] == 3 and cache.stats()["hits"] == 0
+    for executor in ("sequential", "batch"):
+        result = portfolio_from_file(json_path, csv_path, executor=executor, metric_cache=cache).to_dict()
+        assert result == first
+    assert cache.stats()["hits"] == 6
+    assert np.isclose(first["aggregate_volatility"], expected["aggregate_volatility"], atol=1e-10)
+
+    path = tmp_path / "metrics.json"
+    cache.save(path)
+    reloaded = MetricCache.load(path)
+    portfolio_from_file(json_path, csv_path, executor="batch", metric_cache=reloaded)
+    assert reloaded.stats()["hits"] == 3 and reloaded.stats()["misses"] == 0
+
+
+def test_cached_results_agree_across_backends(tmp_path):
+    # The key leaves out the backend, so every backend must compute the same
+    # metrics, including on prices with gaps.
+    from synthetic import write_market_data, write_portfolio_tree
+
+    gap_csv = tmp_path / "market.csv"
+    gap_json = tmp_path / "portfolio.json"
+    df = write_market_data(gap_csv, 10, 100, seed=2, missing_frac=0.05)
+    symbols = df["symbol"].unique(maintain_order=True).to_list()
+    write_portfolio_tree(gap_json, symbols, depth=1, fan_out=2, positions_per_node=4)
+
+    uncached = {
+        backend: portfolio_from_file(gap_json, gap_csv, executor=executor, backend=backend).to_dict()
+        for backend, executor in (("pandas", "sequential"), ("polars", "batch"), ("numpy", "thread"))
+    }
+    cache = MetricCache()
+    for backend, expected in uncached.items():
+        result = portfolio_from_file(gap_json, gap_csv, backend=backend, metric_cache=cache).to_dict()
+        assert np.isclose(result["aggregate_volatility"], expected["aggregate_volatility"], atol=1e-10)
+        assert np.isclose(result["max_drawdown"], expected["max_drawdown"], atol=1e-10)
+    assert cache.stats()["hits"] > 0
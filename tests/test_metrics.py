@@ -1,5 +1,18 @@
 import numpy as np
-from metrics import compute_volatility, compute_max_drawdown
+import pandas as pd
+import polars as pl
+from metrics import (
+    compute_volatility,
+    compute_max_drawdown,
+    compute_batch_metrics,
+    compute_batch_metrics_pl,
+    rolling_ma_pd,
+    rolling_sd_pd,
+    rolling_sharpe_pd,
+    rolling_moments,
+    rolling_max_drawdown,
+    rolling_sweep_frame,
+)
 
 def test_compute_volatility_basic():
     returns = np.array([0.01, -0.02, 0.015, -0.005])
@@ -14,3 +27,93 @@ def test_compute_max_drawdown_basic():
     peaks = np.maximum.accumulate(cumulative)
     expected_mdd = np.min(cumulative / peaks - 1)
     assert np.isclose(mdd, expected_mdd, atol=1e-10)
+
+def test_batch_metrics_match_per_symbol():
+    rng = np.random.default_rng(7)
+    prices = 100 * np.cumprod(1 + rng.normal(0, 0.02, size=(60, 4)), axis=0)
+    prices[45:, 1] = np.nan
+    prices[1, 2] = np.nan  # leading returns missing, then a fall
+    prices[2:6, 2] = prices[2, 2] * np.linspace(1.2, 1.0, 4)
+    prices[:, 3] = np.nan
+    prices[0, 3] = 50.0
+
+    vols, dds = compute_batch_metrics(prices)
+    for j in range(3):
+        column = prices[:, j]
+        returns = column[1:] / column[:-1] - 1
+        returns = returns[~np.isnan(returns)]
+        assert np.isclose(vols[j], compute_volatility(returns), atol=1e-12)
+        assert np.isclose(dds[j], compute_max_drawdown(returns), atol=1e-12)
+    assert np.isnan(vols[3]) and np.isnan(dds[3])
+
+def test_batch_metrics_polars_matches_numpy():
+    rng = np.random.default_rng(11)
+    prices = 100 * np.cumprod(1 + rng.normal(0, 0.02, size=(30, 3)), axis=0)
+    df = pl.DataFrame(
+        {
+            "symbol": np.repeat(["A", "B", "C"], 30),
+            "price": prices.T.ravel(),
+        }
+    )
+    vols, dds = compute_batch_metrics(prices)
+    stats = compute_batch_metrics_pl(df)
+    assert stats["symbol"].to_list() == ["A", "B", "C"]
+    assert np.allclose(stats["volatility"].to_numpy(), vols, atol=1e-12)
+    assert np.allclose(stats["drawdown"].to_numpy(), dds, atol=1e-12)
+
+def test_rolling_moments_match_pandas():
+    rng = np.random.default_rng(5)
+    returns = rng.normal(0.001, 0.02, size=(120, 3))
+    returns[[4, 40, 41], 1] = np.nan
+    # flat windows: a run of zero returns and a constant run around a gap
+    returns[50:80, 0] = 0.0
+    returns[60:90, 2] = 0.001
+    returns[70, 2] = np.nan
+    frame = pd.DataFrame(returns)
+
+    mean, std, sharpe = rolling_moments(returns, window=20)
+    expected_mean = frame.rolling(20, min_periods=20).mean().to_numpy()
+    expected_std = frame.rolling(20, min_periods=20).std().to_numpy()
+    assert np.allclose(mean, expected_mean, atol=1e-12, equal_nan=True)
+    assert np.allclose(std, expected_std, atol=1e-12, equal_nan=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        assert np.allclose(sharpe, expected_mean / expected_std, atol=1e-9, equal_nan=True)
+    assert np.isnan(sharpe[75, 0]) and std[75, 0] == 0.0
+    _, gap_std, gap_sharpe = rolling_moments(returns, window=20, min_periods=15)
+    assert np.allclose(gap_std, frame.rolling(20, min_periods=15).std().to_numpy(), atol=1e-12, equal_nan=True)
+    assert gap_std[89, 2] == 0.0 and gap_sharpe[89, 2] == np.inf
+
+    series = pd.Series(returns[:, 0])
+    assert np.allclose(
+        rolling_sharpe_pd(series, 20),
+        rolling_ma_pd(series, 20) / rolling_sd_pd(series, 20),
+        atol=1e-9,
+        equal_nan=True,
+    )
+
+def test_rolling_max_drawdown_matches_windows():
+    rng = np.random.default_rng(9)
+    returns = rng.normal(0, 0.03, size=(80, 2))
+    dds = rolling_max_drawdown(returns, window=15)
+    assert np.isnan(dds[:14]).all()
+    for t in range(14, 80):
+        for j in range(2):
+            assert np.isclose(dds[t, j], compute_max_drawdown(returns[t - 14:t + 1, j]), atol=1e-12)
+
+def test_rolling_sweep_frame_matches_single_windows():
+    frame = pd.DataFrame(
+        {
+            "timestamp": np.tile(np.arange(40), 2),
+            "symbol": np.repeat(["A", "B"], 40),
+            "price": 100 * np.cumprod(1 + np.random.default_rng(2).normal(0, 0.01, 80)),
+        }
+    )
+    sweep = rolling_sweep_frame(frame, [5, 20])
+    assert len(sweep) == 2 * 80
+
+    for window in (5, 20):
+        for symbol in ("A", "B"):
+            returns = frame.loc[frame["symbol"] == symbol, "price"].pct_change().reset_index(drop=True)
+            rows = sweep[(sweep["symbol"] == symbol) & (sweep["window"] == window)]
+            assert np.array_equal(rows["timestamp"].to_numpy(), np.arange(40))
+            assert np.allclose(rows["std"], rolling_sd_pd(returns, window), atol=1e-12, equal_nan=True)
@@ -19,3 +19,29 @@ def test_pandas_vs_polars_equivalence():
         assert abs(pd_pos["value"] - pl_pos["value"]) < 1e-8
         assert abs(pd_pos["volatility"] - pl_pos["volatility"]) < 1e-8
         assert abs(pd_pos["drawdown"] - pl_pos["drawdown"]) < 1e-8
+
+
+# float32 prices carry ~7 significant digits; the returns built from them
+# (always in float64) move volatility and drawdown by about 1e-8, so the
+# float32 comparison allows 1e-6.
+FLOAT32_TOLERANCE = 1e-6
+
+
+def test_compact_pandas_vs_polars_equivalence():
+    json_path = "portfolio_structure-1.json"
+    csv_path = "market_data-1.csv"
+
+    reference = portfolio_from_file(json_path, csv_path, use_polars=False).to_dict()
+    for float32, tolerance in ((False, 1e-8), (True, FLOAT32_TOLERANCE)):
+        for use_polars in (False, True):
+            compact = portfolio_from_file(
+                json_path, csv_path, use_polars=use_polars, compact=True, float32=float32
+            ).to_dict()
+
+            assert abs(reference["total_value"] - compact["total_value"]) < 1e-8
+            assert abs(reference["aggregate_volatility"] - compact["aggregate_volatility"]) < tolerance
+            assert abs(reference["max_drawdown"] - compact["max_drawdown"]) < tolerance
+            for ref_pos, pos in zip(reference["positions"], compact["positions"]):
+                assert ref_pos["symbol"] == pos["symbol"]
+                assert abs(ref_pos["volatility"] - pos["volatility"]) < tolerance
+                assert abs(ref_pos["drawdown"] - pos["drawdown"]) < tolerance
@@ -0,0 +1,50 @@
+import numpy as np
+from portfolio import Portfolio, Position
+from position_table import PositionTable
+
+
+def test_position_table_node_aggregation():
+    tree = {
+        "name": "root",
+        "positions": [
+            {"symbol": "A", "quantity": 10, "price": 5.0},
+            {"symbol": "B", "quantity": 2, "price": 50.0},
+        ],
+        "sub_portfolios": [
+            {
+                "name": "empty",
+                "sub_portfolios": [
+                    {"name": "leaf", "positions": [{"symbol": "A", "quantity": 1, "price": 4.0}]},
+                ],
+            },
+        ],
+    }
+    table = PositionTable.from_json(tree)
+    assert table.node_names == ["root", "empty", "leaf"]
+    assert table.children == [[1], [2], []]
+    assert table.symbols == ["A", "B"]
+
+    table.set_symbol_metrics({"A": (0.2, -0.1), "B": (0.4, np.nan)})
+    table.aggregate()
+    assert np.allclose(table.total_value, [150.0, 0.0, 4.0])
+    assert np.allclose(table.aggregate_volatility, [(50 * 0.2 + 100 * 0.4) / 150, 0.0, 0.2])
+    assert np.allclose(table.max_drawdown, [50 * -0.1 / 150, 0.0, -0.1])
+
+    table.volatility[table.symbol_rows("A")] = 0.3
+    table.aggregate([0])
+    assert np.isclose(table.aggregate_volatility[0], (50 * 0.3 + 100 * 0.4) / 150)
+    assert np.isclose(table.aggregate_volatility[2], 0.2)
+
+
+def test_standalone_portfolio_matches_legacy_aggregation():
+    positions = [Position("A", 10, 5.0), Position("B", 2, 50.0)]
+    positions[0].volatility, positions[0].drawdown = 0.2, -0.1
+    positions[1].volatility, positions[1].drawdown = 0.4, -0.3
+    p = Portfolio("hand-built", positions=positions)
+    assert p.total_value is None
+
+    p.compute_aggregate_metrics()
+    weights = np.array([50.0, 100.0]) / 150.0
+    assert np.isclose(p.total_value, 150.0)
+    assert np.isclose(p.aggregate_volatility, np.nansum(weights * [0.2, 0.4]))
+    assert np.isclose(p.max_drawdown, np.nansum(weights * [-0.1, -0.3]))
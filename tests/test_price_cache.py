@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import pandas as pd
+from data_loader import load_price_data, cached_price_file, index_price_data, memory_report
+
+
+def write_csv(path, prices):
+    pd.DataFrame(
+        {
+            "timestamp": ["2024-01-01", "2024-01-01", "2024-01-02", "2024-01-02"],
+            "symbol": ["AAPL", "MSFT", "AAPL", "MSFT"],
+            "price": prices,
+        }
+    ).to_csv(path, index=False)
+
+
+def test_cached_load_matches_csv(tmp_path):
+    csv_path = tmp_path / "prices.csv"
+    write_csv(csv_path, [170.0, 300.0, 171.5, 302.25])
+
+    for use_polars in (False, True):
+        cached = load_price_data(csv_path, use_polars=use_polars)
+        direct = load_price_data(csv_path, use_polars=use_polars, cache=False)
+        assert list(cached.columns) == list(direct.columns)
+        assert list(cached["symbol"]) == list(direct["symbol"])
+        assert np.allclose(np.asarray(cached["price"]), np.asarray(direct["price"]))
+
+
+def test_cache_invalidated_when_source_changes(tmp_path):
+    csv_path = tmp_path / "prices.csv"
+    write_csv(csv_path, [170.0, 300.0, 171.5, 302.25])
+    path = cached_price_file(csv_path)
+    first_mtime = os.stat(path).st_mtime_ns
+
+    os.utime(csv_path, ns=(1, 1))
+    assert cached_price_file(csv_path) == path
+    assert os.stat(path).st_mtime_ns == first_mtime
+
+    write_csv(csv_path, [170.0, 300.0, 999.0, 302.25])
+    df = load_price_data(csv_path)
+    assert 999.0 in df["price"].values
+
+
+def test_filtered_load_matches_mask(tmp_path):
+    csv_path = tmp_path / "prices.csv"
+    write_csv(csv_path, [170.0, 300.0, 171.5, 302.25])
+
+    for use_polars in (False, True):
+        for cache in (False, True):
+            df = load_price_data(
+                csv_path, use_polars=use_polars, cache=cache, symbols=["MSFT"], start="2024-01-02"
+            )
+            assert list(df["symbol"]) == ["MSFT"]
+            assert list(df["price"]) == [302.25]
+
+
+def test_compact_load_and_memory_report(tmp_path):
+    csv_path = tmp_path / "prices.csv"
+    write_csv(csv_path, [170.0, 300.0, 171.5, 302.25])
+
+    for backend in ("pandas", "polars", "numpy"):
+        for cache in (True, False):
+            df = load_price_data(csv_path, backend=backend, cache=cache, float32=True, symbols=["MSFT"])
+            assert np.asarray(df["price"]).dtype == np.float32
+            assert np.asarray(df["timestamp"]).dtype == np.int64
+            assert np.asarray(df["timestamp"])[1] - np.asarray(df["timestamp"])[0] == 86_400 * 10**9
+            index = index_price_data(df, backend=backend)
+            assert index.symbols == ["MSFT"]
+            assert list(index.prices("MSFT")) == [300.0, 302.25]
+
+        report = memory_report(csv_path, backend=backend, float32=True)
+        assert set(report) == {"timestamp", "symbol", "price", "total"}
+        assert report["price"]["after"] * 2 == report["price"]["before"]
+        assert report["total"]["after"] < report["total"]["before"]
+
+
+def test_filtered_load_of_header_only_csv(tmp_path):
+    csv_path = tmp_path / "empty.csv"
+    csv_path.write_text("timestamp,symbol,price\n")
+
+    for backend in ("pandas", "polars", "numpy"):
+        df = load_price_data(
+            csv_path, backend=backend, cache=False, symbols=["MSFT"], columns=["symbol", "price"]
+        )
+        assert len(df) == 0
+        assert list(df.columns) == ["symbol", "price"]
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+from portfolio import portfolio_from_file
+from risk import CovarianceEngine, aligned_returns, tail_risk
+
+
+def test_covariance_engine_rank_one_updates():
+    rng = np.random.default_rng(21)
+    returns = rng.normal(0, 0.02, size=(100, 4))
+    engine = CovarianceEngine(returns[:60], list("ABCD"))
+    assert np.allclose(engine.covariance, np.cov(returns[:60], rowvar=False))
+
+    for row in returns[60:90]:
+        engine.update(row)
+    engine.update(returns[90:])
+    assert np.allclose(engine.covariance, np.cov(returns, rowvar=False), atol=1e-14)
+
+    weights = rng.random((5, 4))
+    expected = np.sqrt([w @ np.cov(returns, rowvar=False) @ w for w in weights])
+    assert np.allclose(engine.portfolio_volatility(weights), expected)
+
+
+def test_aligned_returns_carry_prices_over_gaps():
+    frame = pd.DataFrame(
+        {
+            "timestamp": ["d1", "d2", "d3", "d1", "d3"],
+            "symbol": ["A", "A", "A", "B", "B"],
+            "price": [10.0, 11.0, 12.1, 20.0, 22.0],
+        }
+    )
+    returns, symbols, calendar = aligned_returns(frame)
+    assert symbols == ["A", "B"]
+    assert list(calendar) == ["d2", "d3"]
+    assert np.allclose(returns, [[0.1, 0.0], [0.1, 0.1]])
+
+
+def test_node_covariance_volatility():
+    p = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv")
+    engine = p.compute_covariance_metrics()
+    d = p.to_dict()
+
+    values = np.array([pos["value"] for pos in d["positions"]])
+    weights = np.zeros(len(engine.symbols))
+    for pos, value in zip(d["positions"], values):
+        weights[engine.symbol_index[pos["symbol"]]] += value / values.sum()
+    assert np.isclose(d["covariance_volatility"], np.sqrt(weights @ engine.covariance @ weights))
+
+
+def test_tail_risk_matches_sorted_losses():
+    rng = np.random.default_rng(5)
+    returns = rng.normal(0, 0.01, size=(250, 3))
+    exposures = rng.random((4, 3)) * 1000
+    var, es = tail_risk(returns, exposures, confidence=(0.95, 0.99))
+
+    pnl = np.sort(returns @ exposures.T, axis=0)
+    for j, c in enumerate((0.95, 0.99)):
+        k = int(np.ceil((1 - c) * len(pnl)))
+        assert np.allclose(var[:, j], -pnl[k - 1])
+        assert np.allclose(es[:, j], -pnl[:k].mean(axis=0))
+    assert np.all(es >= var)
+
+    boot_var, boot_es = tail_risk(returns, exposures, bootstrap=200, seed=1)
+    assert np.allclose(boot_var, var, rtol=0.25)
+    assert np.array_equal(boot_var, tail_risk(returns, exposures, bootstrap=200, seed=1)[0])
+
+
+def test_portfolio_tail_risk_in_to_dict():
+    p = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv")
+    p.compute_tail_risk(confidence=(0.95, 0.99))
+    d = p.to_dict()
+    assert set(d["value_at_risk"]) == {"0.95", "0.99"}
+    assert d["expected_shortfall"]["0.99"] >= d["value_at_risk"]["0.99"] > 0
+    for sub in p.sub_portfolios:
+        assert "value_at_risk" in sub.to_dict()
+
+
+def test_what_if_matches_rebuilt_portfolios():
+    p = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv")
+    p.compute_covariance_metrics()
+    current = [pos.quantity for pos in p.positions]
+    quantities = np.array([current, [0, 50], [100, 0], [300, 10], [-20, 80]], dtype=float)
+
+    result = p.what_if(quantities)
+    assert np.isclose(result["total_value"][0], p.total_value)
+    assert np.isclose(result["aggregate_volatility"][0], p.aggregate_volatility)
+    assert np.isclose(result["max_drawdown"][0], p.max_drawdown)
+    assert np.isclose(result["covariance_volatility"][0], p.covariance_volatility)
+    # a single-position candidate reports that position's own metrics
+    msft = p.positions[1]
+    assert np.isclose(result["aggregate_volatility"][1], msft.volatility)
+    assert np.isclose(result["historical_drawdown"][1], msft.drawdown)
+
+    returns, symbols, _ = aligned_returns(p.price_index, ["AAPL", "MSFT"])
+    for i, q in enumerate(quantities):
+        values = q * np.array([pos.price for pos in p.positions])
+        path = returns @ (values / values.sum())
+        wealth = np.cumprod(1 + path)
+        assert np.isclose(result["historical_drawdown"][i], np.min(wealth / np.maximum.accumulate(wealth) - 1))
+        assert np.isclose(result["covariance_volatility"][i], np.std(path, ddof=1))
+
+    chunked = p.what_if(quantities, chunk=2)
+    for name, values in result.items():
+        assert np.allclose(chunked[name], values)
+
+    sub = p.sub_portfolios[0]
+    spy = sub.positions[0]
+    sub_result = sub.what_if([[spy.quantity], [2 * spy.quantity]])
+    assert np.allclose(sub_result["total_value"], [sub.total_value, 2 * sub.total_value])
+    assert np.allclose(sub_result["aggregate_volatility"], spy.volatility)
+    assert np.allclose(sub_result["historical_drawdown"], spy.drawdown)
+
+
+def test_risk_without_price_index_raises():
+    p = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv", executor="stream")
+    assert p.price_index is None
+    with pytest.raises(ValueError, match="no price index"):
+        p.compute_covariance_metrics()
+    with pytest.raises(ValueError, match="no price index"):
+        p.compute_tail_risk()
+    with pytest.raises(ValueError, match="no price index"):
+        p.what_if([[100, 50]])
+    with pytest.raises(ValueError, match="no price index"):
+        p.stress_test(n_paths=100, max_workers=1)
+
+    indexed = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv")
+    engine = CovarianceEngine.from_price_data(indexed.price_index, ["AAPL", "MSFT", "SPY"])
+    p.compute_covariance_metrics(engine)
+    assert p.covariance_volatility > 0
+
+    returns, symbols, _ = aligned_returns(indexed.price_index, ["AAPL", "MSFT", "SPY"])
+    p.compute_tail_risk(returns=(returns, symbols))
+    indexed.compute_tail_risk(returns=(returns, symbols))
+    assert p.tail_risk == indexed.tail_risk
+    assert p.what_if([[100, 50]], returns=(returns, symbols))["total_value"][0] == p.total_value
+    assert p.stress_test(n_paths=100, max_workers=1, returns=(returns, symbols)).n_paths == 100
+
+
+def test_aligned_returns_follow_chronological_order():
+    frame = pd.DataFrame(
+        {"timestamp": ["1/9/2024", "1/10/2024", "1/11/2024"], "symbol": ["A"] * 3, "price": [10.0, 11.0, 12.0]}
+    )
+    returns, _, calendar = aligned_returns(frame)
+    assert list(calendar) == ["1/10/2024", "1/11/2024"]
+    assert np.allclose(returns[:, 0], [0.1, 1 / 11])
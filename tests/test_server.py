@@ -0,0 +1,47 @@
+import asyncio
+import json
+import numpy as np
+from portfolio import portfolio_from_file
+from server import RiskServer, fetch
+
+
+def _flatten(d):
+    values = [d["total_value"], d["aggregate_volatility"], d["max_drawdown"]]
+    values += [v for pos in d["positions"] for v in (pos["value"], pos["volatility"], pos["drawdown"])]
+    for sub in d.get("sub_portfolios", []):
+        values += _flatten(sub)
+    return values
+
+
+def test_server_matches_portfolio_from_file():
+    with open("portfolio_structure-1.json") as f:
+        tree = json.load(f)
+    expected = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv", executor="batch").to_dict()
+
+    async def run():
+        server = RiskServer("market_data-1.csv", batch_window=0.01)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            responses = await asyncio.gather(*(fetch("POST", "/portfolio", tree, port=port) for _ in range(8)))
+            bad = await fetch("POST", "/portfolio", [1, 2], port=port)
+            malformed = await fetch("POST", "/portfolio", {"name": "x", "positions": [{"symbol": "AAPL"}]}, port=port)
+            missing = await fetch("GET", "/nope", port=port)
+            stats = await fetch("GET", "/stats", port=port)
+        return responses, bad, malformed, missing, stats
+
+    responses, bad, malformed, missing, (_, stats) = asyncio.run(run())
+    for status, body in responses:
+        assert status == 200
+        assert np.allclose(
+            np.array(_flatten(body), dtype=float), np.array(_flatten(expected), dtype=float), atol=1e-12, equal_nan=True
+        )
+    assert bad[0] == 400 and missing[0] == 404
+    assert malformed[0] == 400 and "quantity" in malformed[1]["error"]
+
+    assert stats["requests"] == 10 and stats["errors"] == 2
+    assert stats["latency"]["count"] == 8
+    assert stats["latency"]["p50_ms"] <= stats["latency"]["p99_ms"]
+    # eight concurrent requests for the same symbols share one batch
+    assert stats["batching"]["batches"] == 1
+    assert stats["batching"]["symbols_shared"] == 7 * stats["batching"]["symbols_computed"]
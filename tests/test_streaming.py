@@ -0,0 +1,52 @@
+import numpy as np
+from metrics import RunningMetrics, compute_volatility, compute_max_drawdown
+from portfolio import portfolio_from_file
+from streaming import stream_metrics
+
+
+def test_running_metrics_match_full_history():
+    rng = np.random.default_rng(3)
+    prices = 100 * np.cumprod(1 + rng.normal(0, 0.02, 500))
+    prices[[10, 250]] = np.nan
+
+    acc = RunningMetrics()
+    for chunk in np.array_split(prices, 23):
+        acc.update(chunk)
+
+    returns = prices[1:] / prices[:-1] - 1
+    returns = returns[~np.isnan(returns)]
+    assert np.isclose(acc.volatility, compute_volatility(returns), atol=1e-12)
+    assert np.isclose(acc.drawdown, compute_max_drawdown(returns), atol=1e-12)
+
+
+def test_stream_vs_sequential_equivalence():
+    json_path = "portfolio_structure-1.json"
+    csv_path = "market_data-1.csv"
+
+    seq_dict = portfolio_from_file(json_path, csv_path).to_dict()
+    for use_polars in (False, True):
+        stream = portfolio_from_file(json_path, csv_path, use_polars=use_polars, executor="stream")
+        stream_dict = stream.to_dict()
+        assert stream.stream_report.rows > 0
+        assert abs(seq_dict["aggregate_volatility"] - stream_dict["aggregate_volatility"]) < 1e-8
+        assert abs(seq_dict["max_drawdown"] - stream_dict["max_drawdown"]) < 1e-8
+
+
+def test_stream_metrics_small_batches():
+    accumulators, report = stream_metrics("market_data-1.csv", symbols=["AAPL"], batch_rows=7)
+    assert list(accumulators) == ["AAPL"]
+    assert report.batches > 1
+    assert report.peak_rss_mb > 0
+
+
+def test_memory_budget_uses_stream_backend():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys; from streaming import stream_metrics; "
+        "stream_metrics('market_data-1.csv', max_memory_mb=64, backend='polars'); "
+        "print('pandas' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "False"
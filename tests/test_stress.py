@@ -0,0 +1,56 @@
+import numpy as np
+from metrics import compute_max_drawdown
+from portfolio import portfolio_from_file
+from stress import StreamingHistogram, run_stress, simulate_node_returns
+
+
+def test_streaming_histogram_merges_and_quantiles():
+    rng = np.random.default_rng(3)
+    values = -rng.random((20_000, 2)) * 0.5
+    merged = StreamingHistogram(2, -1.0, 0.0).add(values[:7000]).merge(
+        StreamingHistogram(2, -1.0, 0.0).add(values[7000:])
+    )
+    whole = StreamingHistogram(2, -1.0, 0.0).add(values)
+    assert np.array_equal(merged.counts, whole.counts)
+    assert np.allclose(merged.mean, values.mean(axis=0))
+    assert np.allclose(merged.std, values.std(axis=0, ddof=1))
+    assert np.allclose(merged.quantile(0.05), np.quantile(values, 0.05, axis=0), atol=1e-3)
+
+
+def test_block_bootstrap_paths_are_history_runs():
+    history = np.arange(50, dtype=float)[:, None] / 1000
+    paths = simulate_node_returns(np.random.default_rng(0), history, 8, 12, "block", block_size=4)
+    assert paths.shape == (8, 12, 1)
+    steps = np.diff(np.rint(paths[:, :, 0] * 1000), axis=1)[:, :3]
+    assert np.all((steps == 1) | (steps == -49))
+
+
+def test_stress_is_seeded_and_worker_independent():
+    rng = np.random.default_rng(8)
+    node_returns = rng.normal(0.0005, 0.01, size=(250, 3))
+    for method in ("bootstrap", "gaussian"):
+        inline = run_stress(node_returns, n_paths=3000, horizon=15, method=method, max_workers=1, block_paths=500)
+        pooled = run_stress(node_returns, n_paths=3000, horizon=15, method=method, max_workers=2, block_paths=500)
+        for a, b in zip(inline, pooled):
+            assert a.count == 3000
+            assert np.array_equal(a.counts, b.counts)
+            assert np.allclose(a.total, b.total)
+
+
+def test_bootstrap_drawdown_matches_direct_paths():
+    node_returns = np.random.default_rng(1).normal(0, 0.02, size=(100, 2))
+    drawdown, wealth = run_stress(node_returns, n_paths=400, horizon=10, max_workers=1, seed=4, block_paths=400)
+    seed = np.random.SeedSequence(4).spawn(1)[0]
+    paths = simulate_node_returns(np.random.default_rng(seed), node_returns, 400, 10)
+    assert np.allclose(drawdown.mean, compute_max_drawdown(paths, axis=1).mean(axis=0))
+    assert np.allclose(wealth.mean, np.prod(1 + paths, axis=1).mean(axis=0))
+
+
+def test_portfolio_stress_summary():
+    p = portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv")
+    result = p.stress_test(n_paths=2000, horizon=10, method="block", max_workers=2)
+    summary = result.summary()
+    assert result.n_paths == 2000
+    assert summary[0]["name"] == p.name
+    assert -1.0 <= summary[0]["drawdown"]["q0.05"] <= summary[0]["drawdown"]["q0.5"] <= 0.0
+    assert summary[0]["terminal_value"]["q0.01"] <= summary[0]["terminal_value"]["q0.5"]
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+from data_loader import SymbolIndex
+
+
+def make_prices():
+    return pd.DataFrame(
+        {
+            "timestamp": ["d1", "d1", "d2", "d2", "d3", "d3", "d4"],
+            "symbol": ["MSFT", "AAPL", "MSFT", "AAPL", "AAPL", "MSFT", "AAPL"],
+            "price": [300.0, 170.0, 301.0, 171.5, 169.0, 305.0, 172.0],
+        }
+    )
+
+
+def test_symbol_index_matches_mask_pandas():
+    df = make_prices()
+    index = SymbolIndex(df)
+    for symbol in ["AAPL", "MSFT"]:
+        expected = df[df["symbol"] == symbol]["price"].values
+        assert np.array_equal(index.get(symbol)["price"].values, expected)
+        assert np.array_equal(index.prices(symbol), expected)
+    assert len(index.get("SPY")) == 0
+
+
+def test_symbol_index_matches_mask_polars():
+    df = pl.from_pandas(make_prices())
+    index = SymbolIndex(df, use_polars=True)
+    for symbol in ["AAPL", "MSFT"]:
+        expected = df.filter(pl.col("symbol") == symbol)["price"].to_numpy()
+        assert np.array_equal(index.get(symbol)["price"].to_numpy(), expected)
+        assert np.array_equal(index.prices(symbol), expected)
+    assert len(index.get("SPY")) == 0
+
+
+def test_aligned_prices_on_ragged_calendar():
+    from parallel import threading_pd, threading_pl
+    from metrics import rolling_ma_pd, rolling_ma_pl
+
+    df = make_prices().iloc[:-2]  # MSFT misses d4, AAPL misses d3
+    index = SymbolIndex(df)
+    prices, calendar = index.aligned_prices(["MSFT", "AAPL", "SPY"], fill="nan")
+    assert list(calendar) == ["d1", "d2", "d3"]
+    assert prices.flags.c_contiguous and not prices.flags.writeable
+    assert np.array_equal(prices, [[300.0, 170.0, np.nan], [301.0, 171.5, np.nan], [np.nan, 169.0, np.nan]], equal_nan=True)
+
+    filled, _ = index.aligned_prices(["MSFT", "AAPL"])
+    assert np.array_equal(filled[:, 0], [300.0, 301.0, 301.0])
+    assert index.aligned_prices(["MSFT", "AAPL"])[0] is filled
+
+    pd_result = threading_pd(rolling_ma_pd, df, ["MSFT", "AAPL"], window=2)
+    pl_result = threading_pl(rolling_ma_pl, pl.from_pandas(df), ["MSFT", "AAPL"], window=2)
+    expected = [[np.nan, np.nan], [300.5, 170.75], [np.nan, 170.25]]
+    assert np.allclose(pd_result.to_numpy(), expected, equal_nan=True)
+    assert np.allclose(pl_result.to_numpy().astype(float), expected, equal_nan=True)
+
+
+def test_multiprocessing_helpers_on_ragged_calendar():
+    from functools import partial
+    from parallel import multiprocessing_pd, multiprocessing_pl
+    from metrics import rolling_ma_pd, rolling_ma_pl
+
+    df = make_prices().iloc[:-2]
+    expected = [[np.nan, np.nan], [300.5, 170.75], [np.nan, 170.25]]
+    pd_result = multiprocessing_pd(partial(rolling_ma_pd, window=2), df, ["MSFT", "AAPL"], max_workers=2)
+    pl_result = multiprocessing_pl(
+        partial(rolling_ma_pl, window=2), pl.from_pandas(df), ["MSFT", "AAPL"], max_workers=2
+    )
+    assert pl_result.columns == ["MSFT", "AAPL"]
+    assert np.allclose(pd_result.to_numpy(), expected, equal_nan=True)
+    assert np.allclose(pl_result.to_numpy().astype(float), expected, equal_nan=True)
@@ -0,0 +1,43 @@
+import numpy as np
+from portfolio import portfolio_from_file
+from synthetic import (
+    count_positions,
+    generate_market_data,
+    generate_portfolio_tree,
+    write_market_data,
+    write_portfolio_tree,
+)
+
+
+def test_market_data_is_deterministic_and_ragged():
+    a = generate_market_data(20, 60, seed=4, ragged=True, missing_frac=0.05)
+    b = generate_market_data(20, 60, seed=4, ragged=True, missing_frac=0.05)
+    assert a.equals(b)
+    assert len(a) < 20 * 60
+    assert a["price"].is_nan().sum() > 0
+    assert a.columns == ["timestamp", "symbol", "price"]
+
+
+def test_portfolio_tree_shape():
+    tree = generate_portfolio_tree([f"S{i}" for i in range(10)], depth=3, fan_out=2, positions_per_node=2)
+    assert count_positions(tree) == 2 * (1 + 2 + 4 + 8)
+    assert len(tree["sub_portfolios"]) == 2
+
+
+def test_builders_agree_on_synthetic_data(tmp_path):
+    csv_path = tmp_path / "market.csv"
+    json_path = tmp_path / "portfolio.json"
+    df = write_market_data(csv_path, 30, 80, seed=1, ragged=True, missing_frac=0.05)
+    symbols = df["symbol"].unique(maintain_order=True).to_list()
+    write_portfolio_tree(json_path, symbols, depth=2, fan_out=3, positions_per_node=4)
+
+    expected = portfolio_from_file(json_path, csv_path).to_dict()
+    assert np.isfinite(expected["aggregate_volatility"]) and expected["aggregate_volatility"] > 0
+    for backend in ("pandas", "polars", "numpy"):
+        for executor in ("sequential", "thread", "process", "batch", "stream"):
+            result = portfolio_from_file(json_path, csv_path, executor=executor, backend=backend).to_dict()
+            assert np.isclose(result["aggregate_volatility"], expected["aggregate_volatility"], atol=1e-10)
+            assert np.isclose(result["max_drawdown"], expected["max_drawdown"], atol=1e-10)
+            for pos, expected_pos in zip(result["positions"], expected["positions"]):
+                assert np.isclose(pos["volatility"], expected_pos["volatility"], atol=1e-10)
+                assert np.isclose(pos["drawdown"], expected_pos["drawdown"], atol=1e-10)
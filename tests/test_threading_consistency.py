@@ -1,3 +1,4 @@
+import json
 from portfolio import portfolio_from_file
 
 def test_threaded_vs_sequential_equivalence(tmp_path):
@@ -19,3 +20,78 @@ def test_threaded_vs_sequential_equivalence(tmp_path):
         assert abs(seq_pos["value"] - thr_pos["value"]) < 1e-8
         assert abs(seq_pos["volatility"] - thr_pos["volatility"]) < 1e-8
         assert abs(seq_pos["drawdown"] - thr_pos["drawdown"]) < 1e-8
+
+def test_batch_vs_sequential_equivalence():
+    json_path = "portfolio_structure-1.json"
+    csv_path = "market_data-1.csv"
+
+    for use_polars in (False, True):
+        seq_dict = portfolio_from_file(json_path, csv_path, use_polars=use_polars).to_dict()
+        batch_dict = portfolio_from_file(json_path, csv_path, use_polars=use_polars, batch=True).to_dict()
+
+        assert abs(seq_dict["aggregate_volatility"] - batch_dict["aggregate_volatility"]) < 1e-8
+        assert abs(seq_dict["max_drawdown"] - batch_dict["max_drawdown"]) < 1e-8
+
+        for seq_pos, batch_pos in zip(seq_dict["positions"], batch_dict["positions"]):
+            assert seq_pos["symbol"] == batch_pos["symbol"]
+            assert abs(seq_pos["volatility"] - batch_pos["volatility"]) < 1e-8
+            assert abs(seq_pos["drawdown"] - batch_pos["drawdown"]) < 1e-8
+
+def test_process_vs_sequential_equivalence():
+    json_path = "portfolio_structure-1.json"
+    csv_path = "market_data-1.csv"
+
+    for use_polars in (False, True):
+        seq_dict = portfolio_from_file(json_path, csv_path, use_polars=use_polars).to_dict()
+        proc_dict = portfolio_from_file(
+            json_path, csv_path, use_polars=use_polars, executor="process", max_workers=2
+        ).to_dict()
+
+        assert abs(seq_dict["aggregate_volatility"] - proc_dict["aggregate_volatility"]) < 1e-8
+        assert abs(seq_dict["max_drawdown"] - proc_dict["max_drawdown"]) < 1e-8
+
+        for seq_pos, proc_pos in zip(seq_dict["positions"], proc_dict["positions"]):
+            assert seq_pos["symbol"] == proc_pos["symbol"]
+            assert abs(seq_pos["volatility"] - proc_pos["volatility"]) < 1e-8
+            assert abs(seq_pos["drawdown"] - proc_pos["drawdown"]) < 1e-8
+
+def test_threaded_nested_tree_equivalence(tmp_path):
+    csv_path = "market_data-1.csv"
+    node = {"name": "leaf", "positions": [{"symbol": "SPY", "quantity": 5, "price": 430.5}]}
+    for level in range(6):
+        node = {
+            "name": f"level-{level}",
+            "positions": [
+                {"symbol": "AAPL", "quantity": level + 1, "price": 172.35},
+                {"symbol": "MSFT", "quantity": 2, "price": 328.10},
+            ],
+            "sub_portfolios": [
+                node,
+                {"name": f"side-{level}", "positions": [{"symbol": "AAPL", "quantity": 1, "price": 170.0}]},
+            ],
+        }
+    json_path = tmp_path / "nested.json"
+    json_path.write_text(json.dumps(node))
+
+    seq_dict = portfolio_from_file(json_path, csv_path, threaded=False).to_dict()
+    thr_dict = portfolio_from_file(json_path, csv_path, threaded=True).to_dict()
+    assert seq_dict == thr_dict
+
+
+def test_batch_vs_sequential_with_missing_prices(tmp_path):
+    from synthetic import write_market_data, write_portfolio_tree
+
+    csv_path = tmp_path / "market.csv"
+    json_path = tmp_path / "portfolio.json"
+    df = write_market_data(csv_path, 12, 120, seed=3, missing_frac=0.05)
+    symbols = df["symbol"].unique(maintain_order=True).to_list()
+    write_portfolio_tree(json_path, symbols, depth=1, fan_out=2, positions_per_node=4)
+
+    seq_dict = portfolio_from_file(json_path, csv_path).to_dict()
+    for use_polars in (False, True):
+        batch_dict = portfolio_from_file(json_path, csv_path, use_polars=use_polars, batch=True).to_dict()
+        assert abs(seq_dict["aggregate_volatility"] - batch_dict["aggregate_volatility"]) < 1e-8
+        assert abs(seq_dict["max_drawdown"] - batch_dict["max_drawdown"]) < 1e-8
+        for seq_pos, batch_pos in zip(seq_dict["positions"], batch_dict["positions"]):
+            assert abs(seq_pos["volatility"] - batch_pos["volatility"]) < 1e-8
+            assert abs(seq_pos["drawdown"] - batch_pos["drawdown"]) < 1e-8
@@ -0,0 +1,30 @@
+import json
+from portfolio import portfolio_from_file
+from tracing import NULL_SPAN, span, tracing
+
+
+def test_span_is_noop_when_disabled():
+    with span("load_price_data") as s:
+        s.rows = 10
+    assert s is NULL_SPAN
+
+
+def test_portfolio_build_records_stages(tmp_path):
+    with tracing() as tracer:
+        portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv", executor="thread")
+        portfolio_from_file("portfolio_structure-1.json", "market_data-1.csv", executor="process", max_workers=2)
+
+    summary = tracer.summary().set_index("stage")
+    for stage in ("load_price_data", "index", "build_thread", "symbol_task", "pct_change", "aggregate", "process_metric"):
+        assert summary.loc[stage, "calls"] > 0
+    assert summary.loc["load_price_data", "rows"] > 0
+
+    frame = tracer.frame()
+    assert set(frame.loc[frame["stage"] == "symbol_task", "symbol"]) >= {"AAPL", "MSFT"}
+    assert frame.loc[frame["stage"] == "process_metric", "pid"].nunique() >= 1
+    assert all(0 < u <= 1 for u in tracer.utilization("symbol_task").values())
+
+    path = tracer.save(tmp_path / "trace.json")
+    events = json.loads(path.read_text())["traceEvents"]
+    assert len(events) == len(tracer.spans)
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# The active Tracer, or None. span() checks this once and hands back a shared
+# no-op span when tracing is off, so instrumented code pays one global lookup.
+_tracer = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+    rows = None
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "stage", "symbol", "rows", "pid", "tid", "start", "end")
+
+    def __init__(self, tracer, stage, symbol=None, rows=None):
+        self.tracer = tracer
+        self.stage = stage
+        self.symbol = symbol
+        self.rows = rows
+
+    def __enter__(self):
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.end = time.perf_counter_ns()
+        self.tracer.record(self)
+        return False
+
+    def to_tuple(self):
+        return (self.stage, self.symbol, self.rows, self.pid, self.tid, self.start, self.end)
+
+
+class Tracer:
+    # Collects finished spans as (stage, symbol, rows, pid, tid, start_ns,
+    # end_ns) tuples. Worker processes record into a Tracer of their own and
+    # return its spans, which the parent merges with extend(); perf_counter_ns
+    # is a system-wide monotonic clock, so the timelines line up.
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def span(self, stage, symbol=None, rows=None):
+        return Span(self, stage, symbol, rows)
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span.to_tuple())
+
+    def extend(self, spans):
+        with self._lock:
+            self.spans.extend(tuple(s) for s in spans)
+
+    def to_chrome_trace(self):
+        # Complete ("X") events in microseconds, loadable in chrome://tracing
+        # or Perfetto.
+        origin = min((s[5] for s in self.spans), default=0)
+        events = []
+        for stage, symbol, rows, pid, tid, start, end in self.spans:
+            args = {}
+            if symbol is not None:
+                args["symbol"] = symbol
+            if rows is not None:
+                args["rows"] = int(rows)
+            events.append(
+                {
+                    "name": stage,
+                    "ph": "X",
+                    "ts": (start - origin) / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+    def frame(self):
+        import pandas as pd
+
+        df = pd.DataFrame(self.spans, columns=["stage", "symbol", "rows", "pid", "tid", "start", "end"])
+        df["duration_ms"] = (df["end"] - df["start"]) / 1e6
+        return df
+
+    def summary(self):
+        # One row per stage: call count, total/mean/max time, rows processed
+        # and how many threads or processes ran it, slowest stages first.
+        df = self.frame()
+        if df.empty:
+            return df.iloc[:0].reindex(columns=["stage", "calls", "total_ms", "mean_ms", "max_ms", "rows", "workers"])
+        df["worker"] = list(zip(df["pid"], df["tid"]))
+        summary = df.groupby("stage").agg(
+            calls=("duration_ms", "size"),
+            total_ms=("duration_ms", "sum"),
+            mean_ms=("duration_ms", "mean"),
+            max_ms=("duration_ms", "max"),
+            rows=("rows", lambda rows: rows.sum(min_count=1)),
+            workers=("worker", "nunique"),
+        )
+        return summary.sort_values("total_ms", ascending=False).reset_index()
+
+    def utilization(self, stage):
+        # Busy fraction of each (pid, tid) running stage, over the wall time
+        # from the first such span starting to the last one ending.
+        df = self.frame()
+        df = df[df["stage"] == stage]
+        if df.empty:
+            return {}
+        wall = df["end"].max() - df["start"].min()
+        busy = (df["end"] - df["start"]).groupby([df["pid"], df["tid"]]).sum()
+        return {worker: value / wall if wall else 1.0 for worker, value in busy.items()}
+
+
+def span(stage, symbol=None, rows=None):
+    tracer = _tracer
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(stage, symbol, rows)
+
+
+def record_spans(spans):
+    # Merges spans recorded in another process into the active tracer.
+    tracer = _tracer
+    if tracer is not None and spans:
+        tracer.extend(spans)
+
+
+def enabled():
+    return _tracer is not None
+
+
+def enable(tracer=None):
+    global _tracer
+    _tracer = Tracer() if tracer is None else tracer
+    return _tracer
+
+
+def disable():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+@contextmanager
+def tracing(tracer=None):
+    # with tracing() as tracer: ... enables tracing for the block and restores
+    # whatever tracer was active before.
+    global _tracer
+    previous, _tracer = _tracer, Tracer() if tracer is None else tracer
+    try:
+        yield _tracer
+    finally:
+        _tracer = previous